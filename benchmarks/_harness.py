@@ -0,0 +1,30 @@
+# _harness.py
+"""Timing helpers shared by the benchmark scripts."""
+import gc
+import os
+import sys
+import time
+from typing import Callable
+
+# Make the package importable when a benchmark is run as a script from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def best_time(fn: Callable[[], None], repeat: int = 5) -> float:
+    """
+    Run fn repeat times and return the fastest wall time in seconds.
+    The minimum is the least noisy estimate on a shared machine; GC is paused while timing.
+    """
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
@@ -0,0 +1,103 @@
+# bench_exporter.py
+"""
+Exporter throughput against a stub collector: the OTLP exporter encodes (protobuf and JSON, gzip on)
+and hands payloads to a stub instead of the network; the batch pipeline is driven with a no-op exporter.
+Usage: python benchmarks/bench_exporter.py [--quick]
+"""
+import argparse
+from typing import Dict, List
+
+from _harness import best_time
+
+from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.config import Config
+from fastapi_trace_logger.export_processor import BatchExportProcessor
+from fastapi_trace_logger.exporter import OtlpExporter
+
+SPANS_PER_TRACE = 10
+
+
+class StubOtlpExporter(OtlpExporter):
+    """OtlpExporter whose collector always accepts; only counts payload bytes."""
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self.bytes_sent = 0
+
+    def _send(self, payload: bytes) -> bool:
+        self.bytes_sent += len(payload)
+        return True
+
+
+class CountingExporter:
+    """No-op exporter for measuring the pipeline itself."""
+
+    def __init__(self):
+        self.exported = 0
+
+    def export_batch(self, trace_contexts: List[TraceContext]) -> None:
+        self.exported += len(trace_contexts)
+
+    def shutdown(self) -> None:
+        pass
+
+
+def make_trace() -> TraceContext:
+    """A finished trace shaped like a typical request: a root span with nested, attributed children."""
+    trace_context = TraceContext(trace_id="4bf92f3577b34da6a3ce929d0e0e4736")
+    root = trace_context.new_span("http_request")
+    root.set_attribute("http.method", "GET")
+    root.set_attribute("http.target", "/orders/42")
+    for i in range(SPANS_PER_TRACE - 1):
+        span = trace_context.new_span(f"step_{i % 3}")
+        span.set_attribute("db.statement", "SELECT * FROM orders WHERE id = ?")
+        span.add_event("cache_miss", {"key": f"order:{i}"})
+        trace_context.close_span(span)
+    root.set_attribute("http.status_code", 200)
+    trace_context.close_span(root)
+    return trace_context
+
+
+def encode_rate(encoding: str, traces: List[TraceContext], batch_size: int) -> float:
+    config = Config({"OTLP_ENCODING": encoding, "OTLP_COMPRESSION": "gzip"})
+    exporter = StubOtlpExporter(config)
+
+    def export_all() -> None:
+        for start in range(0, len(traces), batch_size):
+            exporter.export_batch(traces[start:start + batch_size])
+
+    return len(traces) * SPANS_PER_TRACE / best_time(export_all, repeat=3)
+
+
+def pipeline_rate(traces: List[TraceContext]) -> float:
+    def submit_all() -> None:
+        processor = BatchExportProcessor(
+            CountingExporter(), max_queue_size=len(traces), max_batch_size=64, flush_interval=1.0
+        )
+        for trace_context in traces:
+            processor.submit(trace_context)
+        processor.force_flush(30.0)
+        processor.shutdown(5.0)
+
+    return len(traces) / best_time(submit_all, repeat=3)
+
+
+def run(quick: bool = False) -> Dict[str, float]:
+    traces = [make_trace() for _ in range(200 if quick else 2_000)]
+    return {
+        "otlp_protobuf_spans_per_sec": encode_rate("protobuf", traces, batch_size=64),
+        "otlp_json_spans_per_sec": encode_rate("json", traces, batch_size=64),
+        "pipeline_traces_per_sec": pipeline_rate(traces),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke run")
+    args = parser.parse_args()
+    for name, value in run(args.quick).items():
+        print(f"{name:<32} {value:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
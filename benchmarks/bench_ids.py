@@ -0,0 +1,48 @@
+# bench_ids.py
+"""
+Trace and span id generation: the former str(uuid.uuid4()) / random.getrandbits path against ids.py,
+both as raw ints and rendered to hex the way logs and propagation headers need them.
+Usage: python benchmarks/bench_ids.py [--quick]
+"""
+import argparse
+import random
+import uuid
+from typing import Callable, Dict
+
+from _harness import best_time
+
+from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.ids import new_span_id, new_trace_id, trace_id_hex
+
+
+def rate(fn: Callable[[], object], count: int) -> float:
+    def loop() -> None:
+        for _ in range(count):
+            fn()
+
+    return count / best_time(loop)
+
+
+def run(quick: bool = False) -> Dict[str, float]:
+    count = 50_000 if quick else 500_000
+    return {
+        "uuid4_str_trace_ids_per_sec": rate(lambda: str(uuid.uuid4()), count),
+        "int_trace_ids_per_sec": rate(new_trace_id, count),
+        "hex_trace_ids_per_sec": rate(lambda: trace_id_hex(new_trace_id()), count),
+        "global_random_span_ids_per_sec": rate(lambda: random.getrandbits(64) or 1, count),
+        "span_ids_per_sec": rate(new_span_id, count),
+        # What every request pays: a new TraceContext whose id is rendered once for logs and headers
+        "trace_contexts_per_sec": rate(lambda: TraceContext().trace_id, count),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke run")
+    args = parser.parse_args()
+    for name, value in run(args.quick).items():
+        print(f"{name:<32} {value:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# bench_json_formatter.py
+"""
+Compare records/sec of JsonFormatter against the formatter it replaced.
+Usage: python benchmarks/bench_json_formatter.py [--records N]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi_trace_logger.logger import JsonFormatter, orjson  # noqa: E402
+
+
+class LegacyJsonFormatter(logging.Formatter):
+    """JsonFormatter as it was before the fast path: strftime and a fresh dict per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, 'thread'):
+            record.thread = threading.get_ident()
+        if not hasattr(record, 'threadName'):
+            record.threadName = threading.current_thread().name
+
+        log_entry = {
+            "timestamp": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread_id": record.thread,
+            "thread_name": record.threadName,
+        }
+        if hasattr(record, "trace_id"):
+            log_entry["trace_id"] = record.trace_id
+        if hasattr(record, "span_id"):
+            log_entry["span_id"] = record.span_id
+        if record.exc_info:
+            log_entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log_entry, ensure_ascii=False, separators=(',', ':'))
+
+
+def make_records(count: int) -> list:
+    """Build records spread over a few seconds, like a busy worker would produce."""
+    records = []
+    start = time.time()
+    for i in range(count):
+        record = logging.LogRecord(
+            "bench", logging.INFO, __file__, 42, "handled request %d for user %s", (i, "alice"), None
+        )
+        record.created = start + i * (3.0 / count)
+        record.msecs = (record.created - int(record.created)) * 1000
+        record.trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        record.span_id = "00f067aa0ba902b7"
+        records.append(record)
+    return records
+
+
+def run_formatter(formatter: logging.Formatter, records: list) -> float:
+    """Return records/sec for formatting every record once."""
+    fmt = formatter.format
+    start = time.perf_counter()
+    for record in records:
+        fmt(record)
+    return len(records) / (time.perf_counter() - start)
+
+
+def candidates() -> list:
+    formatters = [
+        ("legacy", LegacyJsonFormatter()),
+        ("fast_json", JsonFormatter(use_orjson=False)),
+    ]
+    if orjson is not None:
+        formatters.append(("fast_orjson", JsonFormatter()))
+    formatters.append(
+        ("fast_whitelist", JsonFormatter(fields=("timestamp", "level", "message", "trace_id", "span_id")))
+    )
+    return formatters
+
+
+def run(quick: bool = False) -> Dict[str, float]:
+    """Records/sec per formatter, keyed for run_benchmarks.py."""
+    records = make_records(20_000 if quick else 200_000)
+    return {
+        f"{name}_records_per_sec": run_formatter(formatter, records) for name, formatter in candidates()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=200_000)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    baseline = None
+    for name, formatter in candidates():
+        rate = run_formatter(formatter, records)
+        baseline = baseline or rate
+        print(f"{name:<18} {rate:>12,.0f} records/sec  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# bench_logger.py
+"""
+Records/sec through a TraceLogger in text and JSON mode, with and without an active trace,
+and through the structured BoundLogger API with request-bound fields.
+Output goes to os.devnull so the numbers measure filtering and formatting, not the terminal.
+Usage: python benchmarks/bench_logger.py [--quick]
+"""
+import argparse
+import logging
+import os
+from typing import Dict
+
+from _harness import best_time
+
+from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.config import get_config
+from fastapi_trace_logger.logger import BoundLogger, JsonFormatter, TraceFormatter, TraceLogger, trace_context_filter
+from fastapi_trace_logger.trace_middleware import _trace_context_var
+
+
+def make_logger(name: str, formatter: logging.Formatter, stream) -> logging.Logger:
+    """A TraceLogger whose handlers are replaced by one synchronous, trace-enriched handler writing to stream."""
+    logger = TraceLogger(name).get_logger()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(formatter)
+    handler.addFilter(trace_context_filter)
+    logger.handlers = [handler]
+    logger.propagate = False
+    return logger
+
+
+def log_loop(logger: logging.Logger, records: int) -> None:
+    info = logger.info
+    for i in range(records):
+        info("handled request %d for user %s", i, "alice")
+
+
+def debug_loop(logger: logging.Logger, records: int) -> None:
+    debug = logger.debug
+    for i in range(records):
+        debug("cache lookup %d for user %s", i, "alice")
+
+
+def structured_loop(log: BoundLogger, records: int) -> None:
+    info = log.info
+    for i in range(records):
+        info("handled request", request=i, user="alice")
+
+
+def run(quick: bool = False) -> Dict[str, float]:
+    records = 5_000 if quick else 50_000
+    log_format = get_config().LOG_FORMAT
+    results: Dict[str, float] = {}
+    with open(os.devnull, "w") as devnull:
+        loggers = {
+            "text": make_logger("bench.text", TraceFormatter(log_format), devnull),
+            "json": make_logger("bench.json", JsonFormatter(log_format), devnull),
+        }
+        for mode, logger in loggers.items():
+            results[f"{mode}_no_trace_records_per_sec"] = records / best_time(lambda: log_loop(logger, records))
+            token = _trace_context_var.set(TraceContext())
+            try:
+                results[f"{mode}_traced_records_per_sec"] = records / best_time(lambda: log_loop(logger, records))
+            finally:
+                _trace_context_var.reset(token)
+        trace_context = TraceContext()
+        trace_context.bind(tenant="acme", region="eu")
+        token = _trace_context_var.set(trace_context)
+        try:
+            log = BoundLogger(loggers["json"], span_events=False).bind(service_version="1.2.3")
+            results["json_structured_records_per_sec"] = records / best_time(lambda: structured_loop(log, records))
+        finally:
+            _trace_context_var.reset(token)
+        # DEBUG calls below the logger level should cost next to nothing
+        logger = loggers["text"]
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            results["debug_suppressed_calls_per_sec"] = records * 10 / best_time(lambda: debug_loop(logger, records * 10))
+        finally:
+            logger.setLevel(level)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke run")
+    args = parser.parse_args()
+    for name, value in run(args.quick).items():
+        print(f"{name:<32} {value:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench_middleware.py
+"""
+Requests/sec and added latency of TraceMiddleware around a minimal in-process ASGI app.
+No server or network is involved: requests are driven by calling the ASGI callable directly.
+Settings come from the environment as usual (e.g. SAMPLER_TYPE, PROPAGATORS); no exporter is started.
+Usage: python benchmarks/bench_middleware.py [--quick]
+"""
+import argparse
+import asyncio
+import os
+from typing import Dict
+
+from _harness import best_time
+
+from fastapi_trace_logger.config import reload_config
+from fastapi_trace_logger.trace_middleware import TraceMiddleware
+
+_REQUEST = {"type": "http.request", "body": b"", "more_body": False}
+_TRACEPARENT = b"00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+async def hello_app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def make_scope(traceparent: bool) -> dict:
+    headers = [
+        (b"host", b"bench"),
+        (b"user-agent", b"bench/1.0"),
+        (b"accept", b"*/*"),
+        (b"accept-encoding", b"gzip, deflate"),
+    ]
+    if traceparent:
+        headers.append((b"traceparent", _TRACEPARENT))
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/hello", "raw_path": b"/hello", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+
+
+async def receive() -> dict:
+    return _REQUEST
+
+
+async def send(message: dict) -> None:
+    pass
+
+
+def measure(loop: asyncio.AbstractEventLoop, app, scope: dict, requests: int) -> float:
+    """Seconds per request for the fastest of a few runs."""
+
+    async def drive() -> None:
+        for _ in range(requests):
+            # Servers hand every request a fresh scope; the header list is shared, as it is never mutated
+            await app(dict(scope), receive, send)
+
+    return best_time(lambda: loop.run_until_complete(drive())) / requests
+
+
+def run(quick: bool = False) -> Dict[str, float]:
+    requests = 2_000 if quick else 20_000
+    # Measure the request path only, never a background exporter
+    os.environ["EXPORTER"] = "none"
+    reload_config()
+    loop = asyncio.new_event_loop()
+    try:
+        scope = make_scope(traceparent=False)
+        bare = measure(loop, hello_app, scope, requests)
+        off = measure(loop, TraceMiddleware(hello_app, enable_performance=False), scope, requests)
+        on = measure(loop, TraceMiddleware(hello_app, enable_performance=True), scope, requests)
+        propagated = measure(
+            loop, TraceMiddleware(hello_app, enable_performance=True), make_scope(traceparent=True), requests
+        )
+    finally:
+        loop.close()
+    return {
+        "bare_requests_per_sec": 1 / bare,
+        "perf_off_requests_per_sec": 1 / off,
+        "perf_on_requests_per_sec": 1 / on,
+        "perf_on_traceparent_requests_per_sec": 1 / propagated,
+        "perf_off_added_latency_us": (off - bare) * 1e6,
+        "perf_on_added_latency_us": (on - bare) * 1e6,
+        "perf_on_traceparent_added_latency_us": (propagated - bare) * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke run")
+    args = parser.parse_args()
+    for name, value in run(args.quick).items():
+        print(f"{name:<40} {value:>14,.2f}")
+
+
+if __name__ == "__main__":
+    main()
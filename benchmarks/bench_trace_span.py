@@ -0,0 +1,89 @@
+# bench_trace_span.py
+"""
+Per-call overhead of trace_span on sync and async functions, inside a sampled trace,
+inside an unsampled trace and with no trace at all, relative to the undecorated function.
+Usage: python benchmarks/bench_trace_span.py [--quick]
+"""
+import argparse
+import asyncio
+from typing import Callable, Dict, Optional
+
+from _harness import best_time
+
+from fastapi_trace_logger.common import TraceContext, _current_span_var
+from fastapi_trace_logger.decorators import trace_span
+from fastapi_trace_logger.trace_middleware import _trace_context_var
+
+# Calls per simulated request; each request gets a fresh TraceContext so the span cap is never hit
+CALLS_PER_TRACE = 100
+
+
+def work(x: int) -> int:
+    return x + 1
+
+
+async def async_work(x: int) -> int:
+    return x + 1
+
+
+traced_work = trace_span("work")(work)
+traced_async_work = trace_span("work")(async_work)
+
+
+def sync_loop(fn: Callable[[int], int], traces: int, sampled: Optional[bool]) -> None:
+    for _ in range(traces):
+        token = _trace_context_var.set(TraceContext(sampled=sampled)) if sampled is not None else None
+        span_token = _current_span_var.set(None)
+        for i in range(CALLS_PER_TRACE):
+            fn(i)
+        _current_span_var.reset(span_token)
+        if token is not None:
+            _trace_context_var.reset(token)
+
+
+async def async_loop(fn: Callable, traces: int, sampled: Optional[bool]) -> None:
+    for _ in range(traces):
+        token = _trace_context_var.set(TraceContext(sampled=sampled)) if sampled is not None else None
+        span_token = _current_span_var.set(None)
+        for i in range(CALLS_PER_TRACE):
+            await fn(i)
+        _current_span_var.reset(span_token)
+        if token is not None:
+            _trace_context_var.reset(token)
+
+
+def run(quick: bool = False) -> Dict[str, float]:
+    traces = 100 if quick else 1_000
+    calls = traces * CALLS_PER_TRACE
+    results: Dict[str, float] = {}
+
+    plain = best_time(lambda: sync_loop(work, traces, True)) / calls
+    for label, sampled in (("sampled", True), ("unsampled", False), ("no_trace", None)):
+        traced = best_time(lambda: sync_loop(traced_work, traces, sampled)) / calls
+        results[f"sync_{label}_overhead_ns"] = (traced - plain) * 1e9
+    results["sync_sampled_calls_per_sec"] = 1 / (plain + results["sync_sampled_overhead_ns"] / 1e9)
+
+    loop = asyncio.new_event_loop()
+    try:
+        plain = best_time(lambda: loop.run_until_complete(async_loop(async_work, traces, True))) / calls
+        for label, sampled in (("sampled", True), ("unsampled", False), ("no_trace", None)):
+            traced = best_time(
+                lambda: loop.run_until_complete(async_loop(traced_async_work, traces, sampled))
+            ) / calls
+            results[f"async_{label}_overhead_ns"] = (traced - plain) * 1e9
+        results["async_sampled_calls_per_sec"] = 1 / (plain + results["async_sampled_overhead_ns"] / 1e9)
+    finally:
+        loop.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke run")
+    args = parser.parse_args()
+    for name, value in run(args.quick).items():
+        print(f"{name:<32} {value:>14,.1f}")
+
+
+if __name__ == "__main__":
+    main()
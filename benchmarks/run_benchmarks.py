@@ -0,0 +1,137 @@
+# run_benchmarks.py
+"""
+Run the benchmark suite and compare the results with a saved baseline.
+
+Metrics ending in _per_sec are better when higher; metrics ending in _us or _ns (latency / overhead)
+are better when lower. A metric that got worse than the baseline by more than --tolerance is reported
+as a regression and makes the script exit with status 1.
+
+Baselines are machine specific: record one on the machine that runs the comparison.
+Usage:
+    python benchmarks/run_benchmarks.py --save-baseline      # record benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py                      # compare against it
+    python benchmarks/run_benchmarks.py --only middleware,trace_span --quick
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+# Suite name -> module exposing run(quick) -> {metric: value}
+SUITES = {
+    "middleware": "bench_middleware",
+    "trace_span": "bench_trace_span",
+    "logger": "bench_logger",
+    "json_formatter": "bench_json_formatter",
+    "exporter": "bench_exporter",
+    "ids": "bench_ids",
+}
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_sec")
+
+
+def run_suites(names: List[str], quick: bool) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in names:
+        print(f"running {name} ...", flush=True)
+        results[name] = importlib.import_module(SUITES[name]).run(quick)
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float
+) -> List[str]:
+    """Print every metric next to its baseline value and return the regressed ones."""
+    regressions = []
+    for suite, metrics in results.items():
+        print(f"\n[{suite}]")
+        for metric, value in metrics.items():
+            base: Optional[float] = baseline.get(suite, {}).get(metric)
+            if base is None:
+                print(f"  {metric:<42} {value:>14,.2f}  (no baseline)")
+                continue
+            if higher_is_better(metric):
+                change = (value - base) / base if base else 0.0
+            else:
+                # Overheads can be near zero or negative; compare against the larger magnitude
+                change = (base - value) / max(abs(base), abs(value), 1e-9)
+            flag = ""
+            if change < -tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{suite}.{metric}")
+            print(f"  {metric:<42} {value:>14,.2f}  baseline {base:>14,.2f}  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help=f"comma-separated suites to run, from: {', '.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default 0.15)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else list(SUITES)
+    unknown = [name for name in names if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(unknown)}")
+
+    results = run_suites(names, args.quick)
+    document = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if args.save_baseline:
+        previous: Dict[str, Dict[str, float]] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                previous = json.load(f)["results"]
+        # Suites not run this time keep their earlier baseline
+        document["results"] = {**previous, **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        compare(results, {}, args.tolerance)
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+
+    baseline: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            stored = json.load(f)
+        baseline = stored["results"]
+        if stored["meta"].get("quick") != args.quick:
+            print("warning: baseline and this run use different --quick settings", file=sys.stderr)
+    else:
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one", file=sys.stderr)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
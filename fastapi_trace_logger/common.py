@@ -1,42 +1,378 @@
 # common.py
+import contextvars
+import itertools
 import time
-import uuid
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, Tuple, Union
+
+from fastapi_trace_logger.ids import new_span_id, new_trace_id, span_id_hex, trace_id_hex
+
+# Span currently active in this async task / thread.
+# asyncio tasks run in a copy of the context, so concurrent gather() children each see
+# their own current span while still inheriting the parent that was active when they started.
+_current_span_var: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+# Bounds on per-trace / per-span data so a misbehaving handler cannot grow a trace without limit.
+# Change them through configure_limits(); TraceMiddleware applies the Config values.
+MAX_SPANS_PER_TRACE = 1000
+MAX_SPAN_ATTRIBUTES = 32
+MAX_SPAN_EVENTS = 32
+MAX_ATTRIBUTE_LENGTH = 256
+# Fold repeated sibling spans (same parent and name) into one summary span
+AGGREGATE_REPEATED_SPANS = False
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+def configure_limits(
+    max_spans_per_trace: Optional[int] = None,
+    max_span_attributes: Optional[int] = None,
+    max_span_events: Optional[int] = None,
+    max_attribute_length: Optional[int] = None,
+    aggregate_repeated_spans: Optional[bool] = None,
+) -> None:
+    """Set process-wide span limits; arguments left as None keep their current value."""
+    global MAX_SPANS_PER_TRACE, MAX_SPAN_ATTRIBUTES, MAX_SPAN_EVENTS, MAX_ATTRIBUTE_LENGTH, AGGREGATE_REPEATED_SPANS
+    if max_spans_per_trace is not None:
+        MAX_SPANS_PER_TRACE = max_spans_per_trace
+    if max_span_attributes is not None:
+        MAX_SPAN_ATTRIBUTES = max_span_attributes
+    if max_span_events is not None:
+        MAX_SPAN_EVENTS = max_span_events
+    if max_attribute_length is not None:
+        MAX_ATTRIBUTE_LENGTH = max_attribute_length
+    if aggregate_repeated_spans is not None:
+        AGGREGATE_REPEATED_SPANS = aggregate_repeated_spans
+
+
+def _bounded_value(value: Any) -> Any:
+    """Keep primitive attribute values as-is, truncating strings; anything else is stored as a truncated str."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if not isinstance(value, str):
+        value = str(value)
+    return value if len(value) <= MAX_ATTRIBUTE_LENGTH else value[:MAX_ATTRIBUTE_LENGTH]
+
+
+class Span:
+    """
+    A single timed operation within a trace.
+    Uses __slots__ and keeps its ids as ints, rendering them to hex only on export or log output.
+    Timestamps are int nanoseconds since the epoch, measured with time.perf_counter_ns() and anchored to
+    wall-clock time once per trace, so durations are exact and immune to clock adjustments;
+    start_time / end_time / duration expose them as float seconds.
+    Parent id is an int for spans created in this process, or the raw string received from upstream.
+    Attributes and events are created lazily and capped by MAX_SPAN_ATTRIBUTES / MAX_SPAN_EVENTS.
+    """
+
+    __slots__ = (
+        "name", "_span_id", "_parent_id", "_start_ns", "_end_ns", "_anchor_ns", "_token",
+        "attributes", "events", "status", "status_message",
+        "dropped_attributes_count", "dropped_events_count", "_summary",
+    )
+
+    def __init__(self, name: str, span_id: int, parent_id: Union[int, str], start_ns: int, anchor_ns: int = 0):
+        self.name = name
+        self._span_id = span_id
+        self._parent_id = parent_id
+        self._start_ns = start_ns
+        self._end_ns: Optional[int] = None
+        # Epoch ns minus perf_counter_ns at trace start, shared by all spans of a trace
+        self._anchor_ns = anchor_ns
+        self._token: Optional[contextvars.Token] = None
+        # Created on first use, most spans never need them
+        self.attributes: Optional[Dict[str, Any]] = None
+        # (epoch ns, name, attributes) tuples
+        self.events: Optional[List[Tuple[int, str, Optional[Dict[str, Any]]]]] = None
+        self.status: Optional[str] = None
+        self.status_message: Optional[str] = None
+        self.dropped_attributes_count = 0
+        self.dropped_events_count = 0
+        # Set on short-lived repeats that are folded into this summary span when closed
+        self._summary: Optional["Span"] = None
+
+    @property
+    def start_time(self) -> float:
+        """Start as epoch seconds."""
+        return self._start_ns / 1e9
+
+    @property
+    def end_time(self) -> Optional[float]:
+        """End as epoch seconds, None while the span is open."""
+        end_ns = self._end_ns
+        return end_ns / 1e9 if end_ns is not None else None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Duration in seconds, None while the span is open."""
+        end_ns = self._end_ns
+        return (end_ns - self._start_ns) / 1e9 if end_ns is not None else None
+
+    @property
+    def duration_ns(self) -> Optional[int]:
+        """Duration in integer nanoseconds, None while the span is open."""
+        end_ns = self._end_ns
+        return end_ns - self._start_ns if end_ns is not None else None
+
+    @property
+    def span_id(self) -> str:
+        """Span id rendered as 16 hex characters."""
+        return span_id_hex(self._span_id)
+
+    @property
+    def parent_span_id(self) -> str:
+        """Parent span id rendered as hex, or the upstream string as received."""
+        parent_id = self._parent_id
+        if type(parent_id) is int:
+            return span_id_hex(parent_id)
+        return parent_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """
+        Attach a key/value attribute to the span; ignored on non-recording spans.
+        New keys beyond MAX_SPAN_ATTRIBUTES are dropped, long values are truncated.
+        """
+        if not self._span_id:
+            return
+        attributes = self.attributes
+        if attributes is None:
+            attributes = self.attributes = {}
+        elif len(attributes) >= MAX_SPAN_ATTRIBUTES and key not in attributes:
+            self.dropped_attributes_count += 1
+            return
+        attributes[key] = _bounded_value(value)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        """Record a timestamped event; events beyond MAX_SPAN_EVENTS are dropped."""
+        if not self._span_id:
+            return
+        events = self.events
+        if events is None:
+            events = self.events = []
+        elif len(events) >= MAX_SPAN_EVENTS:
+            self.dropped_events_count += 1
+            return
+        if attributes:
+            attributes = {
+                key: _bounded_value(value)
+                for key, value in itertools.islice(attributes.items(), MAX_SPAN_ATTRIBUTES)
+            }
+        events.append((self._anchor_ns + time.perf_counter_ns(), name, attributes or None))
+
+    def set_status(self, status: str, message: Optional[str] = None) -> None:
+        """Set STATUS_OK or STATUS_ERROR, with an optional description."""
+        if not self._span_id:
+            return
+        self.status = status
+        self.status_message = _bounded_value(message) if message else None
+
+    def record_exception(self, exc: BaseException) -> None:
+        """Add an "exception" event and mark the span as errored."""
+        if not self._span_id:
+            return
+        message = str(exc)
+        self.add_event("exception", {"exception.type": type(exc).__name__, "exception.message": message})
+        self.set_status(STATUS_ERROR, f"{type(exc).__name__}: {message}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert span to the dictionary layout used by exporters and logs."""
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "attributes": dict(self.attributes) if self.attributes else {},
+            "events": [
+                {"timestamp": timestamp / 1e9, "name": name, "attributes": attributes or {}}
+                for timestamp, name, attributes in self.events or ()
+            ],
+            "status": self.status,
+            "status_message": self.status_message,
+            "dropped_attributes_count": self.dropped_attributes_count,
+            "dropped_events_count": self.dropped_events_count,
+        }
+
+    # Dict-style access kept for code written against the former span dicts
+    def __getitem__(self, key: str) -> Any:
+        if key not in _SPAN_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in _SPAN_FIELDS:
+            return default
+        return getattr(self, key)
+
+    def __repr__(self) -> str:
+        return f"Span(name={self.name!r}, span_id={self.span_id}, parent_span_id={self.parent_span_id})"
+
+
+_SPAN_FIELDS = frozenset((
+    "name", "span_id", "parent_span_id", "start_time", "end_time", "duration",
+    "attributes", "events", "status", "status_message", "dropped_attributes_count", "dropped_events_count",
+))
+
+
+# Returned by new_span() for unsampled traces; never stored, activated or timed
+NON_RECORDING_SPAN = Span("", 0, "0", 0)
 
 
 class TraceContext:
     """
     Trace context manager for storing trace_id, parent_span_id and performance spans.
     Uses contextvars for async-safe context propagation.
+    An unsampled context keeps its ids for propagation and logging but records no spans.
+    Locally generated trace ids are kept as a 128-bit int and rendered to 32 hex characters on first use.
+    At most max_spans spans are kept (further ones are counted in dropped_spans), and with
+    aggregate_repeated enabled repeated sibling spans are folded into one summary span
+    carrying aggregate.count / total / min / max attributes.
     """
 
-    def __init__(self, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None):
-        self.trace_id: str = trace_id or str(uuid.uuid4())
+    def __init__(self, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None, sampled: bool = True):
+        # Upstream trace id as received, or None until a generated one is first rendered
+        self._trace_id: Optional[str] = trace_id or None
+        self._trace_id_int: Optional[int] = None if trace_id else new_trace_id()
         self.parent_span_id: str = parent_span_id or "0"
-        self.start_time: float = time.time()
+        # Read the wall clock once; every timestamp of this trace is anchor + perf_counter_ns()
+        self._anchor_ns: int = time.time_ns() - time.perf_counter_ns()
+        self._start_ns: int = self._anchor_ns + time.perf_counter_ns()
         self.spans: list = []
+        self.sampled: bool = sampled
+        # Opaque vendor state received in a W3C tracestate header, passed on unchanged
+        self.tracestate: Optional[str] = None
+        self.error: bool = False
+        # Structured log fields bound to this request with bind(); replaced, never mutated, on each bind
+        self.fields: Optional[Dict[str, Any]] = None
+        self.max_spans: int = MAX_SPANS_PER_TRACE
+        self.dropped_spans: int = 0
+        self.aggregate_repeated: bool = AGGREGATE_REPEATED_SPANS
+        # (parent id, name) -> first span with that key, only used when aggregating
+        self._span_by_key: Dict[Tuple[Union[int, str], str], Span] = {}
 
-    def new_span(self, name: str, parent_span_id: Optional[str] = None) -> Dict[str, Any]:
-        """Create and register a new span with parent-child relationship."""
+    def new_span(self, name: str, parent_span_id: Optional[str] = None, activate: bool = True) -> Span:
+        """
+        Create and register a new span with parent-child relationship.
+        The new span becomes the current span of the calling task until it is closed,
+        unless activate is False (e.g. for spans that outlive the call that opened them).
+        Returns NON_RECORDING_SPAN without any bookkeeping when the trace is not sampled
+        or already holds max_spans spans.
+        """
+        if not self.sampled:
+            return NON_RECORDING_SPAN
         # 如果没有显式指定parent_span_id，则自动获取当前活跃的span作为父span
+        parent_id: Union[int, str]
         if parent_span_id is None:
-            parent_span_id = self._get_current_active_span_id()
-
-        span = {
-            "name": name,
-            "span_id": str(uuid.uuid4()),
-            "parent_span_id": parent_span_id,
-            "start_time": time.time(),
-            "end_time": None,
-            "duration": None,
-        }
+            parent_id = self._get_current_active_parent()
+        else:
+            parent_id = parent_span_id
+
+        if self.aggregate_repeated:
+            key = (parent_id, name)
+            first = self._span_by_key.get(key)
+            if first is not None and first.end_time is not None:
+                # Repeat of a finished sibling: time it, but fold it into the first span on close.
+                # It shares the summary's id so its own children aggregate under the summary too.
+                span = Span(name, first._span_id, parent_id, self._anchor_ns + time.perf_counter_ns(), self._anchor_ns)
+                span._summary = first
+                if activate:
+                    span._token = _current_span_var.set(span)
+                return span
+
+        if len(self.spans) >= self.max_spans:
+            self.dropped_spans += 1
+            return NON_RECORDING_SPAN
+
+        span = Span(name, new_span_id(), parent_id, self._anchor_ns + time.perf_counter_ns(), self._anchor_ns)
         self.spans.append(span)
+        if self.aggregate_repeated and key not in self._span_by_key:
+            self._span_by_key[key] = span
+        if activate:
+            span._token = _current_span_var.set(span)
         return span
 
-    def close_span(self, span: Dict[str, Any]) -> None:
-        """Mark a span as completed and calculate duration."""
-        span["end_time"] = time.time()
-        span["duration"] = span["end_time"] - span["start_time"]
+    def close_span(self, span: Span) -> None:
+        """Mark a span as completed, calculate duration and restore the previous current span."""
+        if span is NON_RECORDING_SPAN:
+            return
+        span._end_ns = self._anchor_ns + time.perf_counter_ns()
+        if span._summary is not None:
+            self._fold_into_summary(span._summary, span)
+        token = span._token
+        if token is not None:
+            span._token = None
+            try:
+                _current_span_var.reset(token)
+            except (ValueError, RuntimeError):
+                # Closed from another context than the one it was opened in; that context keeps its own value
+                pass
+
+    @staticmethod
+    def _fold_into_summary(summary: Span, span: Span) -> None:
+        """Add a finished repeat's timing (and errors) to its summary span."""
+        attributes = summary.attributes
+        if attributes is None or "aggregate.count" not in attributes:
+            # First repeat: seed the aggregate with the summary span's own run
+            duration = summary.duration
+            summary.set_attribute("aggregate.count", 1)
+            summary.set_attribute("aggregate.total_duration", duration)
+            summary.set_attribute("aggregate.min_duration", duration)
+            summary.set_attribute("aggregate.max_duration", duration)
+            attributes = summary.attributes
+            if attributes is None or "aggregate.count" not in attributes:
+                # Attribute limit already reached on the summary; nothing to aggregate into
+                return
+        duration = span.duration
+        attributes["aggregate.count"] += 1
+        attributes["aggregate.total_duration"] += duration
+        if duration < attributes["aggregate.min_duration"]:
+            attributes["aggregate.min_duration"] = duration
+        if duration > attributes["aggregate.max_duration"]:
+            attributes["aggregate.max_duration"] = duration
+        # The summary covers the time range of all its repeats
+        if span._end_ns > summary._end_ns:
+            summary._end_ns = span._end_ns
+        if span.status is not None and summary.status is None:
+            summary.set_status(span.status, span.status_message)
+
+    @property
+    def trace_id(self) -> str:
+        trace_id = self._trace_id
+        if trace_id is None:
+            trace_id = self._trace_id = trace_id_hex(self._trace_id_int)
+        return trace_id
+
+    @trace_id.setter
+    def trace_id(self, value: str) -> None:
+        self._trace_id = value
+        self._trace_id_int = None
+
+    @property
+    def start_time(self) -> float:
+        """Trace start as epoch seconds."""
+        return self._start_ns / 1e9
+
+    def bind(self, **fields: Any) -> None:
+        """
+        Attach key-value fields to every log record emitted for the rest of this request.
+        Records already handed to an async log queue keep the fields that were bound when they were logged.
+        """
+        self.fields = {**self.fields, **fields} if self.fields else fields
+
+    def now_ns(self) -> int:
+        """Current time on this trace's clock, as epoch ns."""
+        return self._anchor_ns + time.perf_counter_ns()
+
+    def elapsed(self) -> float:
+        """Seconds since the trace started, on the monotonic clock."""
+        return (self.now_ns() - self._start_ns) / 1e9
+
+    @property
+    def current_span(self) -> Optional[Span]:
+        """The span currently active in the calling task, or None."""
+        return _current_span_var.get()
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert trace context to dictionary for export."""
@@ -44,17 +380,23 @@ class TraceContext:
             "trace_id": self.trace_id,
             "parent_span_id": self.parent_span_id,
             "start_time": self.start_time,
-            "duration": time.time() - self.start_time,
-            "spans": self.spans,
+            "duration": self.elapsed(),
+            "spans": [span.to_dict() for span in self.spans],
         }
 
     def _get_current_active_span_id(self) -> str:
         """
         获取当前活跃的span ID作为新span的父ID
         """
-        # 查找最近创建但尚未关闭的span
-        for span in reversed(self.spans):
-            if span.get("end_time") is None:
-                return span["span_id"]
-        # 如果没有未关闭的span，则使用trace context的parent_span_id
+        parent_id = self._get_current_active_parent()
+        if type(parent_id) is int:
+            return span_id_hex(parent_id)
+        return parent_id
+
+    def _get_current_active_parent(self) -> Union[int, str]:
+        """Return the raw id of the most recent open span, or the trace's parent_span_id."""
+        span = _current_span_var.get()
+        if span is not None:
+            return span._span_id
+        # 如果没有活跃的span，则使用trace context的parent_span_id
         return self.parent_span_id
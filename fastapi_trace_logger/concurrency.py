@@ -0,0 +1,237 @@
+# concurrency.py
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import contextvars
+import functools
+import inspect
+from typing import Any, Callable, Coroutine, List, Optional, Tuple
+
+from fastapi_trace_logger.common import Span, TraceContext, _current_span_var
+from fastapi_trace_logger.decorators import _recording_context
+from fastapi_trace_logger.trace_middleware import _trace_context_var, submit_trace
+
+
+# ProcessPoolExecutor.map() submits partial(_process_chunk, fn) per chunk of arguments
+_process_chunk = getattr(concurrent.futures.process, "_process_chunk", None)
+
+
+def _span_name(fn: Callable) -> str:
+    """Readable span name for a callable, looking through functools.partial and process pool map() chunks."""
+    while isinstance(fn, functools.partial):
+        fn = fn.args[0] if fn.func is _process_chunk and fn.args else fn.func
+    return getattr(fn, "__qualname__", None) or getattr(fn, "__name__", None) or type(fn).__name__
+
+
+def _run_in_span(trace_context: TraceContext, name: str, fn: Callable, args: tuple, kwargs: dict) -> Any:
+    """Run fn inside a child span of whatever span is current in the calling context."""
+    span = trace_context.new_span(name)
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        span.record_exception(e)
+        raise
+    finally:
+        trace_context.close_span(span)
+
+
+class TracedThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that runs each submitted callable in a copy of the submitter's context,
+    so trace_id and the current span reach the worker thread, and records one child span per call.
+    map() goes through submit() and is traced per item as well.
+    Spans are added to the request's own TraceContext, so wait for the futures before the request returns:
+    work still running afterwards changes a trace the exporter may already be reading. For fire-and-forget
+    work submit traced_background(fn) to a plain executor instead; it records into a linked context.
+    """
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> concurrent.futures.Future:
+        trace_context = _trace_context_var.get(None)
+        if trace_context is None:
+            return super().submit(fn, *args, **kwargs)
+        context = contextvars.copy_context()
+        if not trace_context.sampled:
+            # Nothing to record; the copied context still carries trace_id for logging
+            return super().submit(context.run, fn, *args, **kwargs)
+        return super().submit(context.run, _run_in_span, trace_context, _span_name(fn), fn, args, kwargs)
+
+
+# Span fields shipped back from a worker process, in Span.__slots__ order minus the local-only ones
+_SPAN_STATE_FIELDS = (
+    "name", "_span_id", "_parent_id", "_start_ns", "_anchor_ns", "_end_ns",
+    "attributes", "events", "status", "status_message",
+    "dropped_attributes_count", "dropped_events_count",
+)
+
+
+def _span_state(span: Span) -> tuple:
+    return tuple(getattr(span, field) for field in _SPAN_STATE_FIELDS)
+
+
+def _span_from_state(state: tuple) -> Span:
+    span = Span(state[0], state[1], state[2], state[3], state[4])
+    for field, value in zip(_SPAN_STATE_FIELDS[5:], state[5:]):
+        setattr(span, field, value)
+    return span
+
+
+def _run_in_process(
+    carrier: Tuple[str, Any, bool], name: str, fn: Callable, args: tuple, kwargs: dict
+) -> Tuple[bool, Any, List[tuple]]:
+    """
+    Worker-process side of TracedProcessPoolExecutor.
+    Rebuilds a TraceContext from the carrier (trace_id, parent span id, sampled), runs fn in a span
+    and returns (succeeded, result or exception, finished span states) for the parent to merge.
+    """
+    trace_id, parent_id, sampled = carrier
+    trace_context = TraceContext(trace_id=trace_id, parent_span_id=parent_id, sampled=sampled)
+    token = _trace_context_var.set(trace_context)
+    span_token = _current_span_var.set(None)
+    try:
+        try:
+            result = (True, _run_in_span(trace_context, name, fn, args, kwargs))
+        except Exception as e:
+            result = (False, e)
+        return result + ([_span_state(span) for span in trace_context.spans if span._end_ns is not None],)
+    finally:
+        _current_span_var.reset(span_token)
+        _trace_context_var.reset(token)
+
+
+class TracedProcessPoolExecutor(concurrent.futures.ProcessPoolExecutor):
+    """
+    ProcessPoolExecutor that carries the minimal trace identity (trace_id, parent span id, sampled flag)
+    to the worker process, records a span around each call there, and merges the spans recorded
+    in the worker back into the submitter's TraceContext when the call completes.
+    The callable and its arguments must be picklable, as with any process pool.
+    """
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> concurrent.futures.Future:
+        trace_context = _trace_context_var.get(None)
+        if trace_context is None:
+            return super().submit(fn, *args, **kwargs)
+        carrier = (trace_context.trace_id, trace_context._get_current_active_parent(), trace_context.sampled)
+        inner = super().submit(_run_in_process, carrier, _span_name(fn), fn, args, kwargs)
+        outer: concurrent.futures.Future = concurrent.futures.Future()
+
+        def done(future: concurrent.futures.Future) -> None:
+            if future.cancelled():
+                outer.cancel()
+            # False if the caller cancelled the returned future; it only gets notified then
+            if not outer.set_running_or_notify_cancel():
+                return
+            error = future.exception()
+            if error is not None:
+                # The pool itself failed (e.g. a worker died); fn never reported back
+                outer.set_exception(error)
+                return
+            succeeded, value, span_states = future.result()
+            _merge_spans(trace_context, span_states)
+            if succeeded:
+                outer.set_result(value)
+            else:
+                outer.set_exception(value)
+
+        inner.add_done_callback(done)
+        return outer
+
+
+def _merge_spans(trace_context: TraceContext, span_states: List[tuple]) -> None:
+    """Add spans recorded in a worker process to trace_context, honoring its span limit."""
+    for state in span_states:
+        if len(trace_context.spans) >= trace_context.max_spans:
+            trace_context.dropped_spans += 1
+            continue
+        trace_context.spans.append(_span_from_state(state))
+
+
+async def _traced_coroutine(trace_context: TraceContext, name: str, coro: Coroutine) -> Any:
+    span = trace_context.new_span(name)
+    try:
+        return await coro
+    except Exception as e:
+        span.record_exception(e)
+        raise
+    finally:
+        trace_context.close_span(span)
+
+
+def create_task(coro: Coroutine, *, name: Optional[str] = None) -> asyncio.Task:
+    """
+    asyncio.create_task() that records the task as a child span of the current span.
+    The task runs in a copy of the caller's context (as any asyncio task does), so its own spans
+    nest under the task span instead of under whatever the caller does next.
+    Await the task before the request finishes, or use traced_background() for work that outlives it.
+    """
+    trace_context = _recording_context()
+    if trace_context is None:
+        return asyncio.create_task(coro, name=name)
+    span_name = name or getattr(coro, "__qualname__", None) or "task"
+    return asyncio.create_task(_traced_coroutine(trace_context, span_name, coro), name=name)
+
+
+def traced_background(func: Callable, name: Optional[str] = None) -> Callable:
+    """
+    Wrap a function that runs after the response is sent, e.g. with FastAPI BackgroundTasks:
+    `background_tasks.add_task(traced_background(send_email), to)`.
+
+    Call this inside the request. When the wrapper runs, it records into a new TraceContext that keeps
+    the request's trace_id and uses the request's current span as parent. That context is exported
+    on its own through the middleware's pipeline, so the request's trace is never mutated after export.
+
+    Args:
+        func: Sync or async callable to trace
+        name: Span name, defaults to the function name
+    """
+    trace_context = _trace_context_var.get(None)
+    if trace_context is None:
+        return func
+    trace_id = trace_context.trace_id
+    parent_id = trace_context._get_current_active_parent()
+    sampled = trace_context.sampled
+    span_name = name or _span_name(func)
+
+    def start() -> Tuple[TraceContext, Span, contextvars.Token, contextvars.Token]:
+        linked = TraceContext(trace_id=trace_id, parent_span_id=parent_id, sampled=sampled)
+        token = _trace_context_var.set(linked)
+        span_token = _current_span_var.set(None)
+        span = linked.new_span(span_name)
+        span.set_attribute("background", True)
+        return linked, span, token, span_token
+
+    def finish(linked: TraceContext, span: Span, token: contextvars.Token, span_token: contextvars.Token) -> None:
+        linked.close_span(span)
+        _current_span_var.reset(span_token)
+        _trace_context_var.reset(token)
+        if linked.spans:
+            submit_trace(linked)
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            linked, span, token, span_token = start()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                linked.error = True
+                span.record_exception(e)
+                raise
+            finally:
+                finish(linked, span, token, span_token)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
+        linked, span, token, span_token = start()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            linked.error = True
+            span.record_exception(e)
+            raise
+        finally:
+            finish(linked, span, token, span_token)
+
+    return sync_wrapper
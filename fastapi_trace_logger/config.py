@@ -1,43 +1,330 @@
 # config.py
+import logging
 import os
+import signal
+import threading
+import types
+from typing import Callable, Dict, List, Mapping, Optional
 
 
 class Config:
     """
     Configuration class that loads settings from environment variables.
     Provides strongly-typed, default-valued configuration options for the tracing system.
+    Instances are immutable snapshots; components share the current one through get_config(),
+    and reload_config() swaps in a new snapshot at runtime.
     """
 
-    def __init__(self):
-        self.load_from_env()
+    __slots__ = (
+        "CONFIG_FILE",
+        "LOG_LEVEL",
+        "TRACE_HEADER_NAME",
+        "PROPAGATORS",
+        "LOG_FORMAT",
+        "ENABLE_JSON_LOG",
+        "LOG_JSON_FIELDS",
+        "LOG_JSON_STATIC_FIELDS",
+        "LOG_ASYNC",
+        "LOG_QUEUE_SIZE",
+        "LOG_OVERFLOW_POLICY",
+        "LOG_SPAN_EVENTS",
+        "LOG_FILE",
+        "LOG_FILE_MAX_BYTES",
+        "LOG_FILE_ROTATE_INTERVAL",
+        "LOG_FILE_BACKUP_COUNT",
+        "LOG_FILE_COMPRESSION",
+        "LOG_FILE_BUFFER_SIZE",
+        "ENABLE_JAEGER",
+        "EXPORTER",
+        "SERVICE_NAME",
+        "JAEGER_HOST",
+        "JAEGER_PORT",
+        "OTLP_ENDPOINT",
+        "OTLP_ENCODING",
+        "OTLP_COMPRESSION",
+        "OTLP_HEADERS",
+        "OTLP_TIMEOUT",
+        "OTLP_MAX_RETRIES",
+        "OTLP_RETRY_BUFFER_SIZE",
+        "EXPORT_QUEUE_SIZE",
+        "EXPORT_BATCH_SIZE",
+        "EXPORT_FLUSH_INTERVAL",
+        "EXPORT_DROP_ON_OVERFLOW",
+        "EXPORT_ENQUEUE_TIMEOUT",
+        "EXPORT_SHUTDOWN_TIMEOUT",
+        "SAMPLER_TYPE",
+        "SAMPLER_PARAM",
+        "TAIL_SAMPLING_ENABLED",
+        "TAIL_SAMPLING_LATENCY_THRESHOLD_MS",
+        "TAIL_SAMPLING_RATE",
+        "ENABLE_METRICS",
+        "METRICS_MAX_SERIES",
+        "METRICS_BUCKETS",
+        "MAX_SPANS_PER_TRACE",
+        "MAX_SPAN_ATTRIBUTES",
+        "MAX_SPAN_EVENTS",
+        "MAX_ATTRIBUTE_LENGTH",
+        "AGGREGATE_REPEATED_SPANS",
+        "WS_MESSAGE_SAMPLE_RATE",
+        "TRACE_STORE_ENABLED",
+        "TRACE_STORE_SIZE",
+        "_frozen",
+    )
+
+    def __init__(self, environ: Optional[Mapping[str, str]] = None):
+        self.load_from_env(environ)
+        object.__setattr__(self, "_frozen", True)
+
+    def __setattr__(self, name: str, value) -> None:
+        if getattr(self, "_frozen", False):
+            raise AttributeError("Config snapshots are immutable; use reload_config() to change settings")
+        object.__setattr__(self, name, value)
+
+    def load_from_env(self, environ: Optional[Mapping[str, str]] = None):
+        """
+        Load configuration from environment variables with fallback defaults.
+
+        Args:
+            environ: Mapping to read instead of os.environ
+        """
+        getenv = (os.environ if environ is None else environ).get
+
+        # Optional KEY=VALUE file overriding the environment, re-read by reload_config()
+        self.CONFIG_FILE: str = getenv("CONFIG_FILE", "")
+
+        # Level of the fastapi_trace logger; can be changed at runtime through reload_config()
+        self.LOG_LEVEL: str = getenv("LOG_LEVEL", "INFO").upper()
 
-    def load_from_env(self):
-        """Load configuration from environment variables with fallback defaults."""
         # HTTP header name for trace propagation
-        self.TRACE_HEADER_NAME: str = os.getenv("TRACE_HEADER_NAME", "X-Trace-ID")
+        self.TRACE_HEADER_NAME: str = getenv("TRACE_HEADER_NAME", "X-Trace-ID")
+
+        # Trace header formats to read and write, in precedence order: tracecontext, b3, b3multi, legacy
+        self.PROPAGATORS: tuple = tuple(
+            name.strip().lower() for name in getenv("PROPAGATORS", "tracecontext,legacy").split(",") if name.strip()
+        )
 
         # Log format template, supports {trace_id}, {parent_span_id} placeholders
-        self.LOG_FORMAT: str = os.getenv(
+        self.LOG_FORMAT: str = getenv(
             "LOG_FORMAT",
             "[%(asctime)s] [%(levelname)s] [thread=%(thread)d:%(threadName)s] [trace_id=%(trace_id)s] [span_id=%(span_id)s] %(message)s"
         )
 
         # Enable JSON-formatted logs
-        self.ENABLE_JSON_LOG: bool = os.getenv("ENABLE_JSON_LOG", "false").lower() in ("true", "1", "yes")
+        self.ENABLE_JSON_LOG: bool = getenv("ENABLE_JSON_LOG", "false").lower() in ("true", "1", "yes")
+
+        # Comma-separated whitelist of JSON log fields (empty = all fields)
+        self.LOG_JSON_FIELDS: tuple = tuple(
+            field.strip() for field in getenv("LOG_JSON_FIELDS", "").split(",") if field.strip()
+        )
+
+        # Static fields added to every JSON log entry, e.g. "service=orders,env=prod"
+        self.LOG_JSON_STATIC_FIELDS: Mapping[str, str] = types.MappingProxyType(dict(
+            (part.strip() for part in pair.split("=", 1)) for pair in getenv("LOG_JSON_STATIC_FIELDS", "").split(",") if "=" in pair
+        ))
+
+        # Format and write logs on a background thread instead of the caller's (event loop) thread
+        self.LOG_ASYNC: bool = getenv("LOG_ASYNC", "false").lower() in ("true", "1", "yes")
+
+        # Max records buffered by the async log queue and what to do when it is full: "drop_new" or "drop_oldest"
+        self.LOG_QUEUE_SIZE: int = int(getenv("LOG_QUEUE_SIZE", "10000"))
+        self.LOG_OVERFLOW_POLICY: str = getenv("LOG_OVERFLOW_POLICY", "drop_new").lower()
+
+        # Also record structured (BoundLogger) log records as events on the current span
+        self.LOG_SPAN_EVENTS: bool = getenv("LOG_SPAN_EVENTS", "false").lower() in ("true", "1", "yes")
+
+        # Write JSON lines to this file instead of stderr, rotated by size and/or age (seconds, 0 = off)
+        self.LOG_FILE: str = getenv("LOG_FILE", "")
+        self.LOG_FILE_MAX_BYTES: int = int(getenv("LOG_FILE_MAX_BYTES", str(100 * 1024 * 1024)))
+        self.LOG_FILE_ROTATE_INTERVAL: float = float(getenv("LOG_FILE_ROTATE_INTERVAL", "0"))
+
+        # Rotated segments kept (0 = all), their compression ("gzip", "zstd" or "none") and the write buffer size
+        self.LOG_FILE_BACKUP_COUNT: int = int(getenv("LOG_FILE_BACKUP_COUNT", "10"))
+        self.LOG_FILE_COMPRESSION: str = getenv("LOG_FILE_COMPRESSION", "gzip").lower()
+        self.LOG_FILE_BUFFER_SIZE: int = int(getenv("LOG_FILE_BUFFER_SIZE", str(64 * 1024)))
 
         # Enable Jaeger exporter
-        self.ENABLE_JAEGER: bool = os.getenv("ENABLE_JAEGER", "false").lower() in ("true", "1", "yes")
+        self.ENABLE_JAEGER: bool = getenv("ENABLE_JAEGER", "false").lower() in ("true", "1", "yes")
+
+        # Exporter to use: "jaeger", "otlp" or "none"; defaults to "jaeger" when ENABLE_JAEGER is set
+        self.EXPORTER: str = getenv("EXPORTER", "jaeger" if self.ENABLE_JAEGER else "none").lower()
+
+        # Service name reported to the tracing backend
+        self.SERVICE_NAME: str = getenv("SERVICE_NAME", "fastapi-trace-service")
 
         # Jaeger agent host and port
-        self.JAEGER_HOST: str = os.getenv("JAEGER_HOST", "localhost")
-        self.JAEGER_PORT: int = int(os.getenv("JAEGER_PORT", "6831"))
+        self.JAEGER_HOST: str = getenv("JAEGER_HOST", "localhost")
+        self.JAEGER_PORT: int = int(getenv("JAEGER_PORT", "6831"))
+
+        # OTLP/HTTP collector endpoint, payload encoding ("protobuf" or "json") and compression ("gzip" or "none")
+        self.OTLP_ENDPOINT: str = getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self.OTLP_ENCODING: str = getenv("OTLP_ENCODING", "protobuf").lower()
+        self.OTLP_COMPRESSION: str = getenv("OTLP_COMPRESSION", "gzip").lower()
+
+        # Extra request headers for the collector, e.g. "authorization=Bearer xyz"
+        self.OTLP_HEADERS: Mapping[str, str] = types.MappingProxyType(dict(
+            (part.strip() for part in pair.split("=", 1)) for pair in getenv("OTLP_HEADERS", "").split(",") if "=" in pair
+        ))
+
+        # OTLP request timeout (seconds), retries per payload and failed payloads kept for later
+        self.OTLP_TIMEOUT: float = float(getenv("OTLP_TIMEOUT", "10"))
+        self.OTLP_MAX_RETRIES: int = int(getenv("OTLP_MAX_RETRIES", "3"))
+        self.OTLP_RETRY_BUFFER_SIZE: int = int(getenv("OTLP_RETRY_BUFFER_SIZE", "64"))
+
+        # Background export pipeline: queue bound, batch size and max batch age (seconds)
+        self.EXPORT_QUEUE_SIZE: int = int(getenv("EXPORT_QUEUE_SIZE", "2048"))
+        self.EXPORT_BATCH_SIZE: int = int(getenv("EXPORT_BATCH_SIZE", "64"))
+        self.EXPORT_FLUSH_INTERVAL: float = float(getenv("EXPORT_FLUSH_INTERVAL", "1.0"))
+
+        # Drop traces when the export queue is full instead of waiting for room
+        self.EXPORT_DROP_ON_OVERFLOW: bool = getenv("EXPORT_DROP_ON_OVERFLOW", "true").lower() in ("true", "1", "yes")
+
+        # Max seconds a trace waits for queue room (off the event loop) before it is dropped anyway
+        self.EXPORT_ENQUEUE_TIMEOUT: float = float(getenv("EXPORT_ENQUEUE_TIMEOUT", "5.0"))
+
+        # Max seconds to wait for queued traces to drain on shutdown
+        self.EXPORT_SHUTDOWN_TIMEOUT: float = float(getenv("EXPORT_SHUTDOWN_TIMEOUT", "5.0"))
+
+        # Head sampling: "const" (param 1/0), "probabilistic" (param = rate) or "ratelimiting" (param = traces/sec)
+        self.SAMPLER_TYPE: str = getenv("SAMPLER_TYPE", "const").lower()
+        self.SAMPLER_PARAM: float = float(getenv("SAMPLER_PARAM", "1"))
+
+        # Tail sampling: keep errors, requests slower than the threshold and a fraction of the rest
+        self.TAIL_SAMPLING_ENABLED: bool = getenv("TAIL_SAMPLING_ENABLED", "false").lower() in ("true", "1", "yes")
+        self.TAIL_SAMPLING_LATENCY_THRESHOLD_MS: float = float(getenv("TAIL_SAMPLING_LATENCY_THRESHOLD_MS", "500"))
+        self.TAIL_SAMPLING_RATE: float = float(getenv("TAIL_SAMPLING_RATE", "0.1"))
+
+        # In-process RED metrics / latency histograms, served by metrics.MetricsApp
+        self.ENABLE_METRICS: bool = getenv("ENABLE_METRICS", "false").lower() in ("true", "1", "yes")
+        self.METRICS_MAX_SERIES: int = int(getenv("METRICS_MAX_SERIES", "1000"))
+
+        # Comma-separated histogram bucket bounds in seconds
+        self.METRICS_BUCKETS: tuple = tuple(
+            float(bound) for bound in getenv(
+                "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10"
+            ).split(",") if bound.strip()
+        )
+
+        # Memory guard: spans kept per trace, attributes/events kept per span, max attribute string length
+        self.MAX_SPANS_PER_TRACE: int = int(getenv("MAX_SPANS_PER_TRACE", "1000"))
+        self.MAX_SPAN_ATTRIBUTES: int = int(getenv("MAX_SPAN_ATTRIBUTES", "32"))
+        self.MAX_SPAN_EVENTS: int = int(getenv("MAX_SPAN_EVENTS", "32"))
+        self.MAX_ATTRIBUTE_LENGTH: int = int(getenv("MAX_ATTRIBUTE_LENGTH", "256"))
+
+        # Fold repeated sibling spans (same parent and name) into one summary span with count/total/min/max
+        self.AGGREGATE_REPEATED_SPANS: bool = getenv("AGGREGATE_REPEATED_SPANS", "false").lower() in ("true", "1", "yes")
+
+        # Fraction of websocket messages recorded as events on the websocket_session span
+        self.WS_MESSAGE_SAMPLE_RATE: float = float(getenv("WS_MESSAGE_SAMPLE_RATE", "0.1"))
+
+        # Keep the last TRACE_STORE_SIZE finished requests in memory, queryable through trace_store.TraceStoreApp
+        self.TRACE_STORE_ENABLED: bool = getenv("TRACE_STORE_ENABLED", "false").lower() in ("true", "1", "yes")
+        self.TRACE_STORE_SIZE: int = int(getenv("TRACE_STORE_SIZE", "1000"))
 
     @property
     def is_jaeger_enabled(self) -> bool:
         """Helper property to check if Jaeger export is enabled."""
-        return self.ENABLE_JAEGER
+        return self.EXPORTER == "jaeger"
 
     @property
     def is_json_log_enabled(self) -> bool:
         """Helper property to check if JSON logging is enabled."""
         return self.ENABLE_JSON_LOG
+
+
+_config: Optional[Config] = None
+_config_lock = threading.RLock()
+_reload_listeners: List[Callable[[Config], None]] = []
+
+
+def read_config_file(path: str) -> Dict[str, str]:
+    """
+    Parse a KEY=VALUE config file (same keys as the environment variables).
+    Blank lines and lines starting with # are ignored; values may be quoted.
+    """
+    values: Dict[str, str] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+                value = value[1:-1]
+            values[key.strip()] = value
+    return values
+
+
+def load_config(path: Optional[str] = None) -> Config:
+    """
+    Build a Config snapshot from the environment, overridden by the file at path
+    (or CONFIG_FILE when path is None) if one is given.
+    """
+    if path is None:
+        path = os.getenv("CONFIG_FILE", "")
+    if not path:
+        return Config()
+    environ = dict(os.environ)
+    environ.update(read_config_file(path))
+    environ["CONFIG_FILE"] = path
+    return Config(environ)
+
+
+def get_config() -> Config:
+    """Current process-wide Config snapshot, loaded on first use."""
+    config = _config
+    if config is None:
+        with _config_lock:
+            if _config is None:
+                _set_config(load_config())
+            config = _config
+    return config
+
+
+def reload_config(path: Optional[str] = None) -> Config:
+    """
+    Re-read the environment and config file and atomically replace the shared snapshot.
+    Keeps the current snapshot if the new one cannot be loaded.
+
+    Args:
+        path: Config file to read; defaults to the current CONFIG_FILE
+    """
+    with _config_lock:
+        current = get_config()
+        try:
+            config = load_config(current.CONFIG_FILE if path is None else path)
+        except (OSError, ValueError) as e:
+            logging.getLogger(__name__).error(f"Config reload failed, keeping the current settings: {e}")
+            return current
+        _set_config(config)
+        for listener in list(_reload_listeners):
+            try:
+                listener(config)
+            except Exception:
+                logging.getLogger(__name__).exception("Config reload listener failed")
+        return config
+
+
+def add_reload_listener(listener: Callable[[Config], None]) -> None:
+    """Call listener(new_config) after every successful reload_config(); adding the same listener twice is a no-op."""
+    with _config_lock:
+        if listener not in _reload_listeners:
+            _reload_listeners.append(listener)
+
+
+def install_reload_signal(signum: Optional[int] = None, path: Optional[str] = None) -> None:
+    """
+    Reload the config when the process receives signum (SIGHUP by default), e.g. `kill -HUP <worker pid>`.
+    Must be called from the main thread.
+    """
+    if signum is None:
+        signum = getattr(signal, "SIGHUP", None)
+        if signum is None:
+            raise ValueError("SIGHUP is not available on this platform; pass signum explicitly")
+    signal.signal(signum, lambda received, frame: reload_config(path))
+
+
+def _set_config(config: Config) -> None:
+    global _config
+    # A single reference assignment, so readers see either the old or the new snapshot
+    _config = config
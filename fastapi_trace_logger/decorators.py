@@ -1,81 +1,203 @@
 # decorators.py
 import asyncio
+import contextvars
 import functools
+import inspect
 from typing import Callable, Any, Optional
 
-from fastapi_trace_logger.trace_middleware import get_current_trace_context
+from fastapi_trace_logger.common import Span, TraceContext
+from fastapi_trace_logger.trace_middleware import _trace_context_var
 
+# Global switch checked first by every traced call; when False wrappers call straight through
+_tracing_enabled: bool = True
 
-class PerformanceDecorator:
+
+def set_tracing_enabled(enabled: bool) -> None:
+    """Enable or disable trace_span recording process-wide."""
+    global _tracing_enabled
+    _tracing_enabled = enabled
+
+
+def is_tracing_enabled() -> bool:
+    return _tracing_enabled
+
+
+def _recording_context() -> Optional[TraceContext]:
+    """Current trace context if this call should be recorded, else None (no allocation either way)."""
+    if not _tracing_enabled:
+        return None
+    trace_context = _trace_context_var.get(None)
+    if trace_context is None or not trace_context.sampled:
+        return None
+    return trace_context
+
+
+# Context managers entered in the current task / thread, innermost first, as linked
+# (scope, trace_context, span, enclosing entry) tuples. Keeping this per context instead of on the
+# SpanScope lets one scope object be entered nested and from concurrent tasks.
+_open_scopes: contextvars.ContextVar = contextvars.ContextVar("open_span_scopes", default=None)
+
+
+class SpanScope:
     """
-    Decorator class for performance tracing of functions.
-    Automatically creates and closes spans in the current trace context.
-    Usage: @PerformanceDecorator().trace_span("operation_name")
+    Returned by trace_span(name). Works as a decorator for sync/async functions and
+    sync/async generators, and as a context manager: `with trace_span("x"):` / `async with trace_span("x"):`.
+    A scope holds no per-call state, so one instance (e.g. `db_span = trace_span("db")`) can be reused,
+    nested and entered from concurrent tasks.
+    Exceptions escaping the traced code are recorded on the span, which is marked as errored.
     """
 
-    def trace_span(self, name: str) -> Callable:
-        """
-        Decorator factory that returns a decorator to trace a function call as a span.
+    __slots__ = ("name",)
 
-        Args:
-            name: Name of the span to be created
+    def __init__(self, name: str):
+        self.name = name
 
-        Returns:
-            Decorator function that wraps the target function
-        """
+    def __enter__(self) -> Optional[Span]:
+        trace_context = _recording_context()
+        if trace_context is None:
+            # Nothing to record: no span, no entry, no allocation
+            return None
+        span = trace_context.new_span(self.name)
+        _open_scopes.set((self, trace_context, span, _open_scopes.get()))
+        return span
 
-        # 在 decorators.py 中
-        def decorator(func: Callable) -> Callable:
-            @functools.wraps(func)
-            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
-                try:
-                    trace_context = get_current_trace_context()
-                    # 无需手动获取父span ID，new_span会自动处理
-                    span = trace_context.new_span(name)
-                except LookupError:
-                    return await func(*args, **kwargs)
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        entry = _open_scopes.get()
+        if entry is None or entry[0] is not self:
+            # Not recorded on enter, or exited in another context than it was entered in: nothing to close
+            return
+        _, trace_context, span, enclosing = entry
+        _open_scopes.set(enclosing)
+        if isinstance(exc_value, Exception):
+            span.record_exception(exc_value)
+        trace_context.close_span(span)
+
+    async def __aenter__(self) -> Optional[Span]:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.__exit__(exc_type, exc_value, traceback)
+
+    def __call__(self, func: Callable) -> Callable:
+        name = self.name
+        # Hot wrappers inline _recording_context() to save a call per invocation
+        get_trace_context = _trace_context_var.get
 
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args: Any, **kwargs: Any) -> Any:
+                trace_context = _recording_context()
+                # 生成器会在yield处把控制权交给调用方，因此span不设为当前span
+                span = trace_context.new_span(name, activate=False) if trace_context is not None else None
+                inner = func(*args, **kwargs)
+                # Async generators have no `yield from`: forward asend()/athrow() by hand
                 try:
-                    result = await func(*args, **kwargs)
-                    return result
+                    value = await inner.__anext__()
+                    while True:
+                        try:
+                            sent = yield value
+                        except GeneratorExit:
+                            raise
+                        except BaseException as e:
+                            value = await inner.athrow(e)
+                        else:
+                            value = await inner.asend(sent)
+                except StopAsyncIteration:
+                    pass
+                except Exception as e:
+                    if span is not None:
+                        span.record_exception(e)
+                    raise
                 finally:
-                    trace_context.close_span(span)
+                    # Close the inner generator now, not on GC, so its cleanup is part of the span
+                    try:
+                        await inner.aclose()
+                    finally:
+                        if span is not None:
+                            trace_context.close_span(span)
 
+            return async_gen_wrapper
+
+        if asyncio.iscoroutinefunction(func):
             @functools.wraps(func)
-            def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
-                try:
-                    trace_context = get_current_trace_context()
-                    # 获取当前活跃的span作为父span
-                    parent_span_id = self._get_current_span_id(trace_context)
-                    span = trace_context.new_span(name, parent_span_id)
-                except LookupError:
-                    # No trace context available, execute function without tracing
-                    return func(*args, **kwargs)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _tracing_enabled:
+                    trace_context = get_trace_context(None)
+                    if trace_context is not None and trace_context.sampled:
+                        # 无需手动获取父span ID，new_span会自动处理
+                        span = trace_context.new_span(name)
+                        try:
+                            return await func(*args, **kwargs)
+                        except Exception as e:
+                            span.record_exception(e)
+                            raise
+                        finally:
+                            trace_context.close_span(span)
+                return await func(*args, **kwargs)
+
+            return async_wrapper
 
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args: Any, **kwargs: Any) -> Any:
+                trace_context = _recording_context()
+                if trace_context is None:
+                    return (yield from func(*args, **kwargs))
+                span = trace_context.new_span(name, activate=False)
                 try:
-                    result = func(*args, **kwargs)
-                    return result
+                    return (yield from func(*args, **kwargs))
+                except Exception as e:
+                    span.record_exception(e)
+                    raise
                 finally:
                     trace_context.close_span(span)
 
-            # Return appropriate wrapper based on whether function is async
-            if asyncio.iscoroutinefunction(func):
-                return async_wrapper
-            else:
-                return sync_wrapper
+            return gen_wrapper
 
-        return decorator
+        @functools.wraps(func)
+        def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _tracing_enabled:
+                trace_context = get_trace_context(None)
+                if trace_context is not None and trace_context.sampled:
+                    span = trace_context.new_span(name)
+                    try:
+                        return func(*args, **kwargs)
+                    except Exception as e:
+                        span.record_exception(e)
+                        raise
+                    finally:
+                        trace_context.close_span(span)
+            # No trace context, tracing disabled or request unsampled: no span, no allocation
+            return func(*args, **kwargs)
+
+        return sync_wrapper
+
+
+class PerformanceDecorator:
+    """
+    Decorator class for performance tracing of functions.
+    Automatically creates and closes spans in the current trace context.
+    Usage: @PerformanceDecorator().trace_span("operation_name") or `with trace_span("operation_name"):`
+    """
+
+    def trace_span(self, name: str) -> SpanScope:
+        """
+        Decorator factory that returns a decorator to trace a function call as a span.
+        The returned object also works as a (async) context manager.
+
+        Args:
+            name: Name of the span to be created
+
+        Returns:
+            SpanScope usable as a decorator or context manager
+        """
+        return SpanScope(name)
 
     def _get_current_span_id(self, trace_context) -> Optional[str]:
         """
         获取当前活跃的span ID作为新span的父ID
         """
-        # 查找最近创建但尚未关闭的span
-        for span in reversed(trace_context.spans):
-            if span.get("end_time") is None:
-                return span["span_id"]
-        # 如果没有未关闭的span，则使用trace context的parent_span_id
-        return trace_context.parent_span_id
+        return trace_context._get_current_active_span_id()
 
 
 # Convenience instance for easier usage
@@ -0,0 +1,183 @@
+# export_processor.py
+import logging
+import queue
+import threading
+import time
+from typing import Any, List, Optional
+
+from fastapi_trace_logger.common import TraceContext
+
+# Sentinel placed on the queue to wake the worker for flush / shutdown
+_FLUSH = object()
+_SHUTDOWN = object()
+
+
+class BatchExportProcessor:
+    """
+    Background export pipeline that keeps exporters off the request path.
+    Finished traces are put on a bounded queue and a dedicated worker thread
+    hands them to the exporter in batches, flushed by size or by age.
+    """
+
+    def __init__(
+        self,
+        exporter: Any,
+        max_queue_size: int = 2048,
+        max_batch_size: int = 64,
+        flush_interval: float = 1.0,
+        drop_on_overflow: bool = True,
+        enqueue_timeout: float = 5.0,
+    ):
+        self.exporter = exporter
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.drop_on_overflow = drop_on_overflow
+        self.enqueue_timeout = max(0.0, enqueue_timeout)
+        self.logger = logging.getLogger(__name__)
+        self.dropped_traces: int = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue_size))
+        self._flush_done = threading.Condition()
+        self._flush_generation = 0
+        self._shutdown = False
+        self._worker = threading.Thread(
+            target=self._run, name="trace-export-worker", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, trace_context: TraceContext) -> bool:
+        """
+        Enqueue a finished trace for export.
+        Never blocks when drop_on_overflow is enabled; otherwise waits up to enqueue_timeout
+        for room, so call it from a worker thread rather than the event loop.
+        Returns False if the trace was dropped.
+        """
+        if self._shutdown:
+            return False
+        try:
+            if self.drop_on_overflow:
+                self._queue.put_nowait(trace_context)
+            else:
+                self._queue.put(trace_context, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self.dropped_traces += 1
+            return False
+        return True
+
+    def offer(self, trace_context: TraceContext) -> bool:
+        """Enqueue without ever blocking; returns False when the queue is full, without counting a drop."""
+        if self._shutdown:
+            return False
+        try:
+            self._queue.put_nowait(trace_context)
+        except queue.Full:
+            return False
+        return True
+
+    def force_flush(self, timeout: Optional[float] = None) -> bool:
+        """Export everything queued so far. Returns False if the timeout expired first."""
+        if self._shutdown or not self._worker.is_alive():
+            return False
+        with self._flush_done:
+            target = self._flush_generation + 1
+        self._queue.put(_FLUSH)
+        with self._flush_done:
+            return self._flush_done.wait_for(
+                lambda: self._flush_generation >= target, timeout=timeout
+            )
+
+    def shutdown(self, timeout: Optional[float] = 5.0) -> None:
+        """Stop accepting traces, drain the queue and wait for the worker to finish."""
+        if self._shutdown:
+            return
+        self._shutdown = True
+        end = None if timeout is None else time.monotonic() + timeout
+        try:
+            # Wait for room within the timeout; a worker busy exporting may not free any in time
+            self._queue.put(_SHUTDOWN, timeout=timeout)
+        except queue.Full:
+            # The worker also drains and stops on the next trace it takes once the flag is set
+            pass
+        self._worker.join(None if end is None else max(0.0, end - time.monotonic()))
+        if self._worker.is_alive():
+            self.logger.warning("Trace export worker did not drain within %s seconds", timeout)
+        if self.dropped_traces:
+            self.logger.warning("Dropped %d traces because the export queue was full", self.dropped_traces)
+
+    def _run(self) -> None:
+        """Worker loop: collect a batch until it is full or old enough, then export it."""
+        batch: List[TraceContext] = []
+        deadline: Optional[float] = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _SHUTDOWN:
+                self._drain(batch)
+                return
+            if self._shutdown and item is not None and item is not _FLUSH:
+                # shutdown() could not queue its sentinel because the queue was full
+                batch.append(item)
+                self._drain(batch)
+                return
+            if item is _FLUSH:
+                self._export(batch)
+                batch, deadline = [], None
+                with self._flush_done:
+                    self._flush_generation += 1
+                    self._flush_done.notify_all()
+                continue
+
+            if item is not None:
+                if not batch:
+                    # 批次的年龄从第一条trace入批开始计算
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if len(batch) >= self.max_batch_size or (
+                batch and deadline is not None and time.monotonic() >= deadline
+            ):
+                self._export(batch)
+                batch, deadline = [], None
+
+    def _drain(self, batch: List[TraceContext]) -> None:
+        """Export whatever is left in the current batch and in the queue."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _FLUSH or item is _SHUTDOWN:
+                continue
+            batch.append(item)
+            if len(batch) >= self.max_batch_size:
+                self._export(batch)
+                batch = []
+        self._export(batch)
+        # Let the exporter release connections from the thread that used them
+        close = getattr(self.exporter, "shutdown", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                self.logger.error(f"Failed to shut down exporter: {e}")
+        with self._flush_done:
+            self._flush_generation += 1
+            self._flush_done.notify_all()
+
+    def _export(self, batch: List[TraceContext]) -> None:
+        """Hand a batch to the exporter, never letting an exporter error kill the worker."""
+        if not batch:
+            return
+        try:
+            export_batch = getattr(self.exporter, "export_batch", None)
+            if export_batch is not None:
+                export_batch(batch)
+            else:
+                for trace_context in batch:
+                    self.exporter.export(trace_context)
+        except Exception as e:
+            self.logger.error(f"Failed to export batch of {len(batch)} traces: {e}")
@@ -1,22 +1,46 @@
+import collections
+import gzip
+import hashlib
+import http.client
+import json
 import logging
-from typing import Optional
+import random
+import struct
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.common import STATUS_ERROR, STATUS_OK, TraceContext
 from fastapi_trace_logger.config import Config
+from fastapi_trace_logger.propagation import _is_valid_id, _to_hex_trace_id
 
 try:
     from jaeger_client import Config as JaegerConfig
+    from jaeger_client.span_context import SpanContext as JaegerSpanContext
     from jaeger_client.tracer import Tracer
 except ImportError:
     JaegerConfig = None
+    JaegerSpanContext = None
     Tracer = None
     logging.getLogger(__name__).warning("jaeger_client not installed. JaegerExporter will be disabled.")
 
 
+def _hex_trace_id(trace_id: str) -> Tuple[str, Optional[str]]:
+    """
+    Return the trace id as 32 hex chars for backends that need 128-bit ids.
+    Custom non-hex ids are hashed; the original is returned as the second item so it can be kept as a tag.
+    """
+    hex_trace_id = _to_hex_trace_id(trace_id)
+    if hex_trace_id is not None:
+        return hex_trace_id, None
+    return hashlib.blake2b(trace_id.encode(), digest_size=16).hexdigest(), trace_id
+
+
 class JaegerExporter:
     """
     Exports trace context data to Jaeger tracing system.
     Uses jaeger-client library to send spans to Jaeger agent.
+    Spans keep their recorded timestamps and parent links, and join the trace under its own trace id.
     """
 
     def __init__(self, config: Config):
@@ -33,6 +57,7 @@ class JaegerExporter:
         try:
             jaeger_config = JaegerConfig(
                 config={
+                    # Sampling is decided by TraceMiddleware; everything that reaches the exporter is kept
                     "sampler": {"type": "const", "param": 1},
                     "local_agent": {
                         "reporting_host": self.config.JAEGER_HOST,
@@ -40,7 +65,7 @@ class JaegerExporter:
                     },
                     "logging": True,
                 },
-                service_name="fastapi-trace-service",
+                service_name=self.config.SERVICE_NAME,
                 validate=True,
             )
             self.tracer = jaeger_config.initialize_tracer()
@@ -55,7 +80,7 @@ class JaegerExporter:
     def export(self, trace_context: TraceContext) -> None:
         """
         Export trace context spans to Jaeger.
-        This method is synchronous and should be called in a thread pool if used in async context.
+        This method is synchronous; TraceMiddleware calls it from the BatchExportProcessor worker thread.
 
         Args:
             trace_context: TraceContext instance containing spans to export
@@ -65,36 +90,342 @@ class JaegerExporter:
             return
 
         try:
-            # Create root span for the entire trace
-            root_span = self.tracer.start_span(
-                operation_name="http_request",
-                tags={
-                    "trace_id": trace_context.trace_id,
-                    "parent_span_id": trace_context.parent_span_id,
-                },
+            trace_id, original_trace_id = _hex_trace_id(trace_context.trace_id)
+            # Spans without a local parent hang off the upstream parent span (or become trace roots)
+            remote_parent_id = trace_context.parent_span_id
+            remote_parent = JaegerSpanContext(
+                trace_id=int(trace_id, 16),
+                span_id=int(remote_parent_id, 16) if _is_valid_id(remote_parent_id, 16) else 0,
+                parent_id=None,
+                flags=1,
             )
 
-            # Export each span in the trace context
-            for span_data in trace_context.spans:
-                child_span = self.tracer.start_span(
-                    operation_name=span_data["name"],
-                    child_of=root_span,
-                    tags={
-                        "span_id": span_data["span_id"],
-                    },
+            # Parents are always created (and appended) before their children, so one pass
+            # over the spans with an id -> Jaeger span index rebuilds the whole tree
+            index: Dict[str, Any] = {}
+            for position, span_data in enumerate(trace_context.spans):
+                tags = dict(span_data.attributes) if span_data.attributes else {}
+                if original_trace_id is not None:
+                    tags["trace_id.original"] = original_trace_id
+                if position == 0 and trace_context.dropped_spans:
+                    tags["trace.dropped_spans"] = trace_context.dropped_spans
+                if span_data.dropped_attributes_count:
+                    tags["dropped_attributes_count"] = span_data.dropped_attributes_count
+                if span_data.dropped_events_count:
+                    tags["dropped_events_count"] = span_data.dropped_events_count
+                if span_data.status == STATUS_ERROR:
+                    # Jaeger UI's error convention
+                    tags["error"] = True
+                jaeger_span = self.tracer.start_span(
+                    operation_name=span_data.name,
+                    child_of=index.get(span_data.parent_span_id, remote_parent),
+                    tags=tags,
+                    start_time=span_data.start_time,
                 )
+                # Keep our span id (jaeger_client picks a random one) so log span_ids match the trace view
+                jaeger_span.context.span_id = span_data._span_id
+                index[span_data.span_id] = jaeger_span
 
-                # Set duration if available
-                if span_data.get("duration") is not None:
-                    child_span.log_kv({"event": "duration", "value": span_data["duration"]})
+                for timestamp, name, attributes in span_data.events or ():
+                    jaeger_span.log_kv({"event": name, **(attributes or {})}, timestamp=timestamp / 1e9)
+                if span_data.status_message:
+                    jaeger_span.set_tag("status.message", span_data.status_message)
 
-                # Finish the child span
-                child_span.finish()
-
-            # Finish the root span
-            root_span.finish()
+                end_time = span_data.end_time if span_data.end_time is not None else span_data.start_time
+                jaeger_span.finish(finish_time=end_time)
 
             self.logger.debug(f"Exported trace {trace_context.trace_id} with {len(trace_context.spans)} spans")
 
         except Exception as e:
             self.logger.error(f"Failed to export trace {trace_context.trace_id} to Jaeger: {e}")
+
+    def export_batch(self, trace_contexts: List[TraceContext]) -> None:
+        """
+        Export a batch of traces collected by the background export pipeline.
+
+        Args:
+            trace_contexts: Finished TraceContext instances to export
+        """
+        for trace_context in trace_contexts:
+            self.export(trace_context)
+
+
+# OTLP span kinds (opentelemetry.proto.trace.v1.Span.SpanKind)
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_SPAN_KIND_CLIENT = 3
+
+# OTLP status codes (opentelemetry.proto.trace.v1.Status.StatusCode); unset is 0
+_OTLP_STATUS_CODES = {STATUS_OK: 1, STATUS_ERROR: 2}
+
+# Collector responses worth retrying, per the OTLP/HTTP specification
+_RETRYABLE_STATUS = frozenset((429, 502, 503, 504))
+
+
+class OtlpExporter:
+    """
+    Exports traces to an OpenTelemetry collector over OTLP/HTTP.
+    Every batch from the export pipeline becomes one request, encoded as protobuf (hand-written encoder,
+    no extra dependency) or JSON, optionally gzip-compressed, over a kept-alive connection.
+    Failed requests are retried with exponential backoff; payloads that still fail are kept in a
+    bounded retry buffer and resent before the next batch.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        url = urllib.parse.urlsplit(config.OTLP_ENDPOINT)
+        self._https = url.scheme == "https"
+        self._host = url.hostname or "localhost"
+        self._port = url.port or (443 if self._https else 4318)
+        self._path = url.path or "/v1/traces"
+        self._protobuf = config.OTLP_ENCODING != "json"
+        self._gzip = config.OTLP_COMPRESSION == "gzip"
+        self._headers = {
+            "Content-Type": "application/x-protobuf" if self._protobuf else "application/json",
+            **config.OTLP_HEADERS,
+        }
+        if self._gzip:
+            self._headers["Content-Encoding"] = "gzip"
+        self._connection: Optional[http.client.HTTPConnection] = None
+        self._retry_buffer: collections.deque = collections.deque(maxlen=max(1, config.OTLP_RETRY_BUFFER_SIZE))
+        self._resource_attributes = [("service.name", config.SERVICE_NAME)]
+
+    def export(self, trace_context: TraceContext) -> None:
+        """Export a single trace."""
+        self.export_batch([trace_context])
+
+    def export_batch(self, trace_contexts: List[TraceContext]) -> None:
+        """
+        Export a batch of traces in a single OTLP request.
+
+        Args:
+            trace_contexts: Finished TraceContext instances to export
+        """
+        spans = [record for trace_context in trace_contexts for record in self._span_records(trace_context)]
+        if spans:
+            payload = self._encode(spans)
+            if self._gzip:
+                payload = gzip.compress(payload, compresslevel=6)
+            # 先重发之前失败的批次，保持顺序
+            self._retry_buffer.append(payload)
+        while self._retry_buffer:
+            if not self._send(self._retry_buffer[0]):
+                self.logger.warning(f"OTLP export failed, {len(self._retry_buffer)} payloads kept for retry")
+                return
+            self._retry_buffer.popleft()
+
+    def shutdown(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _send(self, payload: bytes) -> bool:
+        """POST one payload, retrying with exponential backoff. Returns False if it should be retried later."""
+        for attempt in range(self.config.OTLP_MAX_RETRIES + 1):
+            if attempt:
+                # 指数退避加随机抖动
+                time.sleep(min(30.0, 0.5 * (2 ** (attempt - 1))) * random.uniform(0.5, 1.0))
+            try:
+                connection = self._get_connection()
+                connection.request("POST", self._path, body=payload, headers=self._headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.logger.debug(f"OTLP export attempt {attempt + 1} failed: {e}")
+                self.shutdown()
+                continue
+            if 200 <= response.status < 300:
+                return True
+            if response.status not in _RETRYABLE_STATUS:
+                self.logger.error(f"OTLP collector rejected batch with status {response.status}, dropping it")
+                return True
+        return False
+
+    def _get_connection(self) -> http.client.HTTPConnection:
+        if self._connection is None:
+            connection_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            self._connection = connection_class(self._host, self._port, timeout=self.config.OTLP_TIMEOUT)
+        return self._connection
+
+    def _span_records(self, trace_context: TraceContext) -> List[Dict[str, Any]]:
+        """Flatten a trace into encoder-neutral span records with OTLP ids, kinds and nanosecond times."""
+        trace_id, original_trace_id = _hex_trace_id(trace_context.trace_id)
+        extra_attributes = []
+        if original_trace_id is not None:
+            extra_attributes.append(("trace_id.original", original_trace_id))
+
+        local_ids = {span.span_id for span in trace_context.spans}
+        records = []
+        for position, span in enumerate(trace_context.spans):
+            parent_id = span.parent_span_id
+            is_local_parent = parent_id in local_ids
+            attributes = list(span.attributes.items()) if span.attributes else []
+            if position == 0 and trace_context.dropped_spans:
+                attributes.append(("trace.dropped_spans", trace_context.dropped_spans))
+            if is_local_parent:
+                kind = _SPAN_KIND_CLIENT if span.attributes and "http.url" in span.attributes else _SPAN_KIND_INTERNAL
+            else:
+                kind = _SPAN_KIND_SERVER
+            end_ns = span._end_ns if span._end_ns is not None else span._start_ns
+            records.append({
+                "trace_id": trace_id,
+                "span_id": span.span_id,
+                "parent_span_id": parent_id if _is_valid_id(parent_id, 16) else "",
+                "trace_state": trace_context.tracestate or "",
+                "name": span.name,
+                "kind": kind,
+                "start": span._start_ns,
+                "end": end_ns,
+                "attributes": attributes + extra_attributes,
+                "events": [
+                    (timestamp, name, list(event_attributes.items()) if event_attributes else [])
+                    for timestamp, name, event_attributes in span.events or ()
+                ],
+                "status_code": _OTLP_STATUS_CODES.get(span.status, 0),
+                "status_message": span.status_message or "",
+                "dropped_attributes_count": span.dropped_attributes_count,
+                "dropped_events_count": span.dropped_events_count,
+            })
+        return records
+
+    def _encode(self, spans: List[Dict[str, Any]]) -> bytes:
+        if self._protobuf:
+            return _encode_otlp_protobuf(self._resource_attributes, spans)
+        return _encode_otlp_json(self._resource_attributes, spans)
+
+
+def _otlp_json_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_json_attributes(attributes: List[tuple]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_json_value(value)} for key, value in attributes]
+
+
+def _encode_otlp_json(resource_attributes: List[tuple], spans: List[Dict[str, Any]]) -> bytes:
+    """ExportTraceServiceRequest in the OTLP/JSON mapping (hex ids, 64-bit integers as strings)."""
+    body = {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_json_attributes(resource_attributes)},
+            "scopeSpans": [{
+                "scope": {"name": "fastapi_trace_logger"},
+                "spans": [
+                    {
+                        "traceId": span["trace_id"],
+                        "spanId": span["span_id"],
+                        "parentSpanId": span["parent_span_id"],
+                        "traceState": span["trace_state"],
+                        "name": span["name"],
+                        "kind": span["kind"],
+                        "startTimeUnixNano": str(span["start"]),
+                        "endTimeUnixNano": str(span["end"]),
+                        "attributes": _otlp_json_attributes(span["attributes"]),
+                        "events": [
+                            {
+                                "timeUnixNano": str(timestamp),
+                                "name": name,
+                                "attributes": _otlp_json_attributes(event_attributes),
+                            }
+                            for timestamp, name, event_attributes in span["events"]
+                        ],
+                        "status": {"code": span["status_code"], "message": span["status_message"]},
+                        "droppedAttributesCount": span["dropped_attributes_count"],
+                        "droppedEventsCount": span["dropped_events_count"],
+                    }
+                    for span in spans
+                ],
+            }],
+        }],
+    }
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+# Minimal protobuf wire-format encoder for the OTLP trace messages we emit
+def _pb_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFFFFFFFFFF
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _pb_bytes(field: int, data: bytes) -> bytes:
+    return _pb_varint(field << 3 | 2) + _pb_varint(len(data)) + data
+
+
+def _pb_string(field: int, value: str) -> bytes:
+    return _pb_bytes(field, value.encode()) if value else b""
+
+
+def _pb_fixed64(field: int, value: int) -> bytes:
+    return _pb_varint(field << 3 | 1) + struct.pack("<Q", value)
+
+
+def _pb_uint(field: int, value: int) -> bytes:
+    return _pb_varint(field << 3) + _pb_varint(value) if value else b""
+
+
+def _pb_any_value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return _pb_varint(2 << 3) + _pb_varint(int(value))
+    if isinstance(value, int):
+        return _pb_varint(3 << 3) + _pb_varint(value)
+    if isinstance(value, float):
+        return _pb_varint(4 << 3 | 1) + struct.pack("<d", value)
+    return _pb_bytes(1, str(value).encode())
+
+
+def _pb_attributes(field: int, attributes: List[tuple]) -> bytes:
+    # KeyValue { string key = 1; AnyValue value = 2; }
+    return b"".join(
+        _pb_bytes(field, _pb_string(1, key) + _pb_bytes(2, _pb_any_value(value)))
+        for key, value in attributes
+    )
+
+
+def _encode_otlp_protobuf(resource_attributes: List[tuple], spans: List[Dict[str, Any]]) -> bytes:
+    """ExportTraceServiceRequest in protobuf binary form."""
+    encoded_spans = []
+    for span in spans:
+        encoded_spans.append(_pb_bytes(2, b"".join((
+            _pb_bytes(1, bytes.fromhex(span["trace_id"])),
+            _pb_bytes(2, bytes.fromhex(span["span_id"])),
+            _pb_string(3, span["trace_state"]),
+            _pb_bytes(4, bytes.fromhex(span["parent_span_id"])) if span["parent_span_id"] else b"",
+            _pb_string(5, span["name"]),
+            _pb_uint(6, span["kind"]),
+            _pb_fixed64(7, span["start"]),
+            _pb_fixed64(8, span["end"]),
+            _pb_attributes(9, span["attributes"]),
+            _pb_uint(10, span["dropped_attributes_count"]),
+            b"".join(
+                # Event { fixed64 time_unix_nano = 1; string name = 2; repeated KeyValue attributes = 3; }
+                _pb_bytes(11, _pb_fixed64(1, timestamp) + _pb_string(2, name) + _pb_attributes(3, event_attributes))
+                for timestamp, name, event_attributes in span["events"]
+            ),
+            _pb_uint(12, span["dropped_events_count"]),
+            # Status { string message = 2; StatusCode code = 3; }
+            _pb_bytes(15, _pb_string(2, span["status_message"]) + _pb_uint(3, span["status_code"])),
+        ))))
+    scope_spans = _pb_bytes(1, _pb_string(1, "fastapi_trace_logger")) + b"".join(encoded_spans)
+    resource = _pb_attributes(1, resource_attributes)
+    resource_spans = _pb_bytes(1, resource) + _pb_bytes(2, scope_spans)
+    return _pb_bytes(1, resource_spans)
+
+
+def create_exporter(config: Config) -> Optional[Any]:
+    """Build the exporter selected by EXPORTER ("jaeger", "otlp" or "none")."""
+    if config.EXPORTER == "otlp":
+        return OtlpExporter(config)
+    if config.EXPORTER == "jaeger":
+        return JaegerExporter(config)
+    return None
@@ -0,0 +1,167 @@
+# file_sink.py
+import gzip
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_STOP = object()
+
+
+class RotatingCompressedFileHandler(logging.Handler):
+    """
+    Buffered file handler writing one formatted record per line, typically JSON from JsonFormatter.
+    Rotates when the file reaches max_bytes or every rotate_interval seconds. A rotated segment is only
+    renamed on the writing thread; compressing it (gzip, or zstd when `zstandard` is installed) and pruning
+    segments beyond backup_count (0 keeps all) happen on a background thread, which also flushes the write buffer
+    every flush_interval seconds so an idle service still gets its logs on disk.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        max_bytes: int = 100 * 1024 * 1024,
+        rotate_interval: float = 0,
+        backup_count: int = 10,
+        compression: str = "gzip",
+        buffer_size: int = 64 * 1024,
+        flush_interval: float = 1.0,
+    ):
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        if compression == "zstd" and zstandard is None:
+            logging.getLogger(__name__).warning("zstandard is not installed, compressing log segments with gzip")
+            compression = "gzip"
+        self.compression = compression
+        # Finished segments only: rotated names with the suffix of the configured compression
+        self._segment_pattern = re.compile(
+            re.escape(os.path.basename(filename)) + r"\.\d{8}-\d{6}-\d{6}0*"
+            + {"gzip": r"\.gz", "zstd": r"\.zst"}.get(compression, "") + "$"
+        )
+        self.buffer_size = max(1, buffer_size)
+        self.flush_interval = flush_interval
+
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        self._stream = None
+        self._size = 0
+        self._next_rollover = 0.0
+        self._open()
+
+        self._pending: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="log-file-sink", daemon=True)
+        self._worker.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = (self.format(record) + "\n").encode("utf-8")
+            if self._stream is None:
+                # Closed already (e.g. a record logged during interpreter shutdown)
+                return
+            if self._size and (
+                self._size + len(data) > self.max_bytes
+                or (self.rotate_interval and record.created >= self._next_rollover)
+            ):
+                self._rotate()
+            self._stream.write(data)
+            self._size += len(data)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._stream is not None:
+                self._stream.flush()
+        finally:
+            self.release()
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Flush and close the file, then let the worker finish compressing rotated segments."""
+        self.acquire()
+        try:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+        finally:
+            self.release()
+        if self._worker.is_alive():
+            self._pending.put(_STOP)
+            self._worker.join(timeout)
+        super().close()
+
+    def _open(self) -> None:
+        self._stream = open(self.filename, "ab", buffering=self.buffer_size)
+        self._size = self._stream.tell()
+        if self.rotate_interval:
+            self._next_rollover = time.time() + self.rotate_interval
+
+    def _rotate(self) -> None:
+        """Rename the current file aside and start a new one; called with the handler lock held."""
+        self._stream.close()
+        # Names sort chronologically, which _prune relies on
+        rotated = f"{self.filename}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        while any(os.path.exists(rotated + ext) for ext in ("", ".gz", ".zst")):
+            rotated += "0"
+        os.replace(self.filename, rotated)
+        self._open()
+        self._pending.put(rotated)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._pending.get(timeout=self.flush_interval)
+            except queue.Empty:
+                try:
+                    self.flush()
+                except (OSError, ValueError):
+                    pass
+                continue
+            if item is _STOP:
+                return
+            try:
+                self._compress(item)
+                self._prune()
+            except OSError as e:
+                logging.getLogger(__name__).warning(f"Failed to compress log segment {item}: {e}")
+
+    def _compress(self, path: str) -> None:
+        if self.compression == "gzip":
+            target = path + ".gz"
+            with open(path, "rb") as src, gzip.open(target + ".tmp", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        elif self.compression == "zstd":
+            target = path + ".zst"
+            with open(path, "rb") as src, open(target + ".tmp", "wb") as dst:
+                zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+        else:
+            return
+        os.replace(target + ".tmp", target)
+        os.remove(path)
+
+    def _prune(self) -> None:
+        """
+        Delete the oldest finished segments beyond backup_count.
+        Segments still waiting to be compressed and unrelated files such as app.log.bak are left alone.
+        """
+        if self.backup_count <= 0:
+            return
+        directory = os.path.dirname(self.filename)
+        segments = [name for name in os.listdir(directory) if self._segment_pattern.match(name)]
+        if len(segments) <= self.backup_count:
+            return
+        segments.sort()
+        for name in segments[:-self.backup_count]:
+            os.remove(os.path.join(directory, name))
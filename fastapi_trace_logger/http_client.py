@@ -0,0 +1,267 @@
+# http_client.py
+import functools
+import urllib.error
+import urllib.request
+from typing import Any, Callable, MutableMapping, Optional
+
+from fastapi_trace_logger.common import STATUS_ERROR, Span, TraceContext
+from fastapi_trace_logger.config import Config, get_config
+from fastapi_trace_logger.propagation import Propagator, create_propagator
+from fastapi_trace_logger.trace_middleware import _trace_context_var
+
+try:
+    import httpx
+
+    _BaseTransport = httpx.BaseTransport
+    _AsyncBaseTransport = httpx.AsyncBaseTransport
+    _SyncByteStream = httpx.SyncByteStream
+    _AsyncByteStream = httpx.AsyncByteStream
+except ImportError:
+    httpx = None
+    _BaseTransport = _AsyncBaseTransport = _SyncByteStream = _AsyncByteStream = object
+
+_propagator: Optional[Propagator] = None
+_propagator_config: Optional[Config] = None
+
+
+def _get_propagator() -> Propagator:
+    """Propagators configured by PROPAGATORS, rebuilt on the first outbound call after a config reload."""
+    global _propagator, _propagator_config
+    config = get_config()
+    if _propagator is None or _propagator_config is not config:
+        _propagator = create_propagator(config)
+        _propagator_config = config
+    return _propagator
+
+
+def inject_trace_headers(headers: MutableMapping[str, str], span: Optional[Span] = None) -> None:
+    """
+    Add propagation headers for the current trace to an outgoing request's headers.
+    Does nothing when no trace context is set.
+
+    Args:
+        headers: Mutable header mapping of the outgoing request
+        span: Client span to use as the downstream parent; defaults to the current span
+    """
+    trace_context = _trace_context_var.get(None)
+    if trace_context is None:
+        return
+    if span is None:
+        span = trace_context.current_span
+    span_id = span.span_id if span is not None and span.end_time is None else None
+    _get_propagator().inject(trace_context, span_id, headers.__setitem__)
+
+
+def _start_client_span(trace_context: TraceContext, method: str, url: str) -> Span:
+    """Open a client span; it is not made current since it may outlive the calling frame."""
+    span = trace_context.new_span(f"HTTP {method}", activate=False)
+    span.set_attribute("http.method", method)
+    span.set_attribute("http.url", url)
+    return span
+
+
+def _finish_client_span(
+    trace_context: TraceContext,
+    span: Span,
+    status_code: Optional[int] = None,
+    response_bytes: Optional[int] = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    """Record the outcome and close the span; a raised error or a 5xx response marks it as errored."""
+    if status_code is not None:
+        span.set_attribute("http.status_code", status_code)
+        if status_code >= 500:
+            span.set_status(STATUS_ERROR, f"HTTP {status_code}")
+    if response_bytes is not None:
+        span.set_attribute("http.response_content_length", response_bytes)
+    if error is not None:
+        span.record_exception(error)
+    trace_context.close_span(span)
+
+
+class _TracedSyncStream(_SyncByteStream):
+    """Counts response body bytes and closes the client span when the body is closed."""
+
+    def __init__(self, stream: Any, finish: Callable[[int], None]):
+        self._stream = stream
+        self._finish = finish
+        self._bytes = 0
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._bytes += len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._finish(self._bytes)
+
+
+class _TracedAsyncStream(_AsyncByteStream):
+    """Async counterpart of _TracedSyncStream."""
+
+    def __init__(self, stream: Any, finish: Callable[[int], None]):
+        self._stream = stream
+        self._finish = finish
+        self._bytes = 0
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._bytes += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._finish(self._bytes)
+
+
+def _request_bytes(request: Any) -> Optional[int]:
+    content_length = request.headers.get("content-length")
+    return int(content_length) if content_length and content_length.isdigit() else None
+
+
+class TracedTransport(_BaseTransport):
+    """
+    httpx transport wrapper that propagates the current trace and records a client span per call.
+    The span covers the request until the response body is closed and records status and byte counts.
+    Usage: httpx.Client(transport=TracedTransport())
+    """
+
+    def __init__(self, transport: Any = None):
+        if httpx is None:
+            raise RuntimeError("httpx is not installed; TracedTransport is unavailable")
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: Any) -> Any:
+        trace_context = _trace_context_var.get(None)
+        if trace_context is None or not trace_context.sampled:
+            if trace_context is not None:
+                inject_trace_headers(request.headers)
+            return self._transport.handle_request(request)
+
+        span = _start_client_span(trace_context, request.method, str(request.url))
+        request_bytes = _request_bytes(request)
+        if request_bytes is not None:
+            span.set_attribute("http.request_content_length", request_bytes)
+        inject_trace_headers(request.headers, span)
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException as e:
+            _finish_client_span(trace_context, span, error=e)
+            raise
+
+        if response.is_closed:
+            # Body loaded already (e.g. a MockTransport response built from content); no close will follow
+            _finish_client_span(trace_context, span, response.status_code, len(response.content))
+            return response
+        finish = functools.partial(_finish_client_span, trace_context, span, response.status_code)
+        response.stream = _TracedSyncStream(response.stream, finish)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncTracedTransport(_AsyncBaseTransport):
+    """
+    Async httpx transport wrapper, see TracedTransport.
+    Usage: httpx.AsyncClient(transport=AsyncTracedTransport())
+    """
+
+    def __init__(self, transport: Any = None):
+        if httpx is None:
+            raise RuntimeError("httpx is not installed; AsyncTracedTransport is unavailable")
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: Any) -> Any:
+        trace_context = _trace_context_var.get(None)
+        if trace_context is None or not trace_context.sampled:
+            if trace_context is not None:
+                inject_trace_headers(request.headers)
+            return await self._transport.handle_async_request(request)
+
+        span = _start_client_span(trace_context, request.method, str(request.url))
+        request_bytes = _request_bytes(request)
+        if request_bytes is not None:
+            span.set_attribute("http.request_content_length", request_bytes)
+        inject_trace_headers(request.headers, span)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as e:
+            _finish_client_span(trace_context, span, error=e)
+            raise
+
+        if response.is_closed:
+            # Body loaded already (e.g. a MockTransport response built from content); no close will follow
+            _finish_client_span(trace_context, span, response.status_code, len(response.content))
+            return response
+        finish = functools.partial(_finish_client_span, trace_context, span, response.status_code)
+        response.stream = _TracedAsyncStream(response.stream, finish)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_original_urlopen = urllib.request.urlopen
+
+
+def traced_urlopen(url: Any, data: Optional[bytes] = None, *args: Any, **kwargs: Any) -> Any:
+    """
+    Drop-in replacement for urllib.request.urlopen that propagates the current trace
+    and records a client span for the call (until the response headers arrive).
+    """
+    trace_context = _trace_context_var.get(None)
+    if trace_context is None:
+        return _original_urlopen(url, data, *args, **kwargs)
+
+    request = url if isinstance(url, urllib.request.Request) else urllib.request.Request(url)
+    if data is not None:
+        # urlopen would do the same; doing it first lets get_method() see the body
+        request.data = data
+    if not trace_context.sampled:
+        _inject_urllib(request, None)
+        return _original_urlopen(request, None, *args, **kwargs)
+
+    span = _start_client_span(trace_context, request.get_method(), request.full_url)
+    if isinstance(request.data, (bytes, bytearray)):
+        span.set_attribute("http.request_content_length", len(request.data))
+    _inject_urllib(request, span)
+    try:
+        response = _original_urlopen(request, None, *args, **kwargs)
+    except urllib.error.HTTPError as e:
+        _finish_client_span(trace_context, span, e.code, error=e)
+        raise
+    except BaseException as e:
+        _finish_client_span(trace_context, span, error=e)
+        raise
+
+    content_length = response.headers.get("Content-Length")
+    _finish_client_span(
+        trace_context,
+        span,
+        response.status,
+        int(content_length) if content_length and content_length.isdigit() else None,
+    )
+    return response
+
+
+def _inject_urllib(request: urllib.request.Request, span: Optional[Span]) -> None:
+    headers: dict = {}
+    inject_trace_headers(headers, span)
+    for name, value in headers.items():
+        request.add_header(name, value)
+
+
+def instrument_urllib() -> None:
+    """Route urllib.request.urlopen through traced_urlopen for the whole process."""
+    urllib.request.urlopen = traced_urlopen
+
+
+def uninstrument_urllib() -> None:
+    """Restore the original urllib.request.urlopen."""
+    urllib.request.urlopen = _original_urlopen
@@ -0,0 +1,37 @@
+# ids.py
+import os
+import random
+
+# Private generator so application code seeding or consuming the global random module cannot
+# make ids repeat. random.Random seeds itself from os.urandom; ids only need to be unique, not secret.
+_random = random.Random()
+_getrandbits = _random.getrandbits
+
+
+def new_trace_id() -> int:
+    """Generate a non-zero random 128-bit trace id."""
+    return _getrandbits(128) or 1
+
+
+def new_span_id() -> int:
+    """Generate a non-zero random 64-bit span id."""
+    return _getrandbits(64) or 1
+
+
+def trace_id_hex(trace_id: int) -> str:
+    """Render a trace id as 32 lowercase hex characters (W3C traceparent form)."""
+    return format(trace_id, "032x")
+
+
+def span_id_hex(span_id: int) -> str:
+    """Render a span id as 16 lowercase hex characters."""
+    return format(span_id, "016x")
+
+
+def _reseed() -> None:
+    # A forked child inherits the parent's generator state and would repeat its ids
+    _random.seed(os.urandom(32))
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed)
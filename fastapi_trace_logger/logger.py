@@ -1,11 +1,185 @@
 # logger.py
+import atexit
 import json
 import logging
+import logging.handlers
+import queue
 import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Async context variable to hold current TraceContext instance (imported from trace_middleware)
+from fastapi_trace_logger.common import _current_span_var
 from fastapi_trace_logger.trace_middleware import _trace_context_var
-from .config import Config
+from .config import Config, add_reload_listener, get_config
+from .file_sink import RotatingCompressedFileHandler
+
+
+class TraceContextFilter(logging.Filter):
+    """
+    Handler filter that adds trace_id and span_id to records.
+    Attached to handlers rather than loggers, so it runs only for records that passed the level checks
+    and are about to be emitted, and it also covers records that other loggers (e.g. sqlalchemy) propagate
+    to those handlers. Loggers with their own handlers and propagate=False, like uvicorn's, need it on
+    theirs: see install_trace_enrichment().
+    It runs on the logging thread, where the trace context is visible, and enriches each record once
+    even if several handlers see it. Thread info is left as logging recorded it.
+    Fields bound to the request with bind_context() are attached as record.bound_fields, and records
+    a BoundLogger flagged for span events are added to the current span here, once they reach a handler.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span_event = record.__dict__.pop("log_span_event", False)
+        if "trace_id" not in record.__dict__:
+            self._enrich(record)
+        if span_event:
+            # After enrichment, so the event carries the request-bound fields too
+            _add_log_event(record)
+        return True
+
+    @staticmethod
+    def _enrich(record: logging.LogRecord) -> None:
+        trace_context = _trace_context_var.get(None)
+        if trace_context is None:
+            record.trace_id = "N/A"
+            record.span_id = "N/A"
+            return
+        record.trace_id = trace_context.trace_id
+        if trace_context.fields:
+            record.bound_fields = trace_context.fields
+        # Use the task's active span if any, else the last span, else parent_span_id
+        span = _current_span_var.get()
+        if span is not None:
+            record.span_id = span.span_id
+        elif trace_context.spans:
+            # If all spans are closed, use the last one
+            record.span_id = trace_context.spans[-1].span_id
+        else:
+            record.span_id = trace_context.parent_span_id
+
+
+# One shared instance, so handlers can be checked for it and enrichment is never attached twice
+trace_context_filter = TraceContextFilter()
+
+
+def install_trace_enrichment(*loggers: Union[logging.Logger, str]) -> int:
+    """
+    Add trace_id / span_id enrichment to every handler of the given loggers or logger names
+    (the root logger by default), so records from any library that propagate there carry trace ids.
+    Loggers that do not propagate keep their records to their own handlers; uvicorn's are configured
+    that way, so enrich them by name: install_trace_enrichment("uvicorn", "uvicorn.access").
+    Handlers added afterwards are not covered; call again after reconfiguring logging.
+    Returns the number of handlers the filter was added to.
+    """
+    added = 0
+    for logger in loggers or (None,):
+        if not isinstance(logger, logging.Logger):
+            logger = logging.getLogger(logger)
+        for handler in logger.handlers:
+            if trace_context_filter not in handler.filters:
+                handler.addFilter(trace_context_filter)
+                added += 1
+    return added
+
+
+def bind_context(**fields: Any) -> bool:
+    """
+    Bind key-value fields to the current request, so every record logged while handling it carries them,
+    e.g. bind_context(user_id=user.id, tenant=tenant.name) in an auth dependency.
+    Returns False (and binds nothing) outside a traced request.
+    """
+    trace_context = _trace_context_var.get(None)
+    if trace_context is None:
+        return False
+    trace_context.bind(**fields)
+    return True
+
+
+class BoundLogger:
+    """
+    Structured logging front end that takes key-value fields instead of a pre-formatted message:
+        log = trace_logger.bind(order_id=order.id)
+        log.info("payment captured", amount=amount, provider="stripe")
+    The level is checked before anything else, and fields travel on the record as-is until the formatter
+    serializes them, so a filtered-out call costs no string or dict building. JsonFormatter writes them as
+    top-level keys, TraceFormatter appends them as key=value pairs. With span_events (LOG_SPAN_EVENTS by
+    default) each record that reaches a handler carrying TraceContextFilter is also added as a "log" event
+    to the current span.
+    """
+
+    __slots__ = ("logger", "fields", "span_events")
+
+    def __init__(
+        self, logger: logging.Logger, fields: Optional[Dict[str, Any]] = None, span_events: Optional[bool] = None
+    ):
+        self.logger = logger
+        self.fields: Dict[str, Any] = fields or {}
+        self.span_events = span_events
+
+    def bind(self, **fields: Any) -> "BoundLogger":
+        """Return a new BoundLogger with fields added to this one's."""
+        return BoundLogger(self.logger, {**self.fields, **fields}, self.span_events)
+
+    # msg and level are positional-only, so fields named "msg" or "level" are logged like any other
+
+    def debug(self, msg: str, /, *args: Any, **fields: Any) -> None:
+        self._log(logging.DEBUG, msg, args, fields)
+
+    def info(self, msg: str, /, *args: Any, **fields: Any) -> None:
+        self._log(logging.INFO, msg, args, fields)
+
+    def warning(self, msg: str, /, *args: Any, **fields: Any) -> None:
+        self._log(logging.WARNING, msg, args, fields)
+
+    def error(self, msg: str, /, *args: Any, **fields: Any) -> None:
+        self._log(logging.ERROR, msg, args, fields)
+
+    def exception(self, msg: str, /, *args: Any, **fields: Any) -> None:
+        fields.setdefault("exc_info", True)
+        self._log(logging.ERROR, msg, args, fields)
+
+    def critical(self, msg: str, /, *args: Any, **fields: Any) -> None:
+        self._log(logging.CRITICAL, msg, args, fields)
+
+    def log(self, level: int, msg: str, /, *args: Any, **fields: Any) -> None:
+        self._log(level, msg, args, fields)
+
+    def _log(self, level: int, msg: str, args: tuple, fields: Dict[str, Any]) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        exc_info = fields.pop("exc_info", None)
+        stack_info = fields.pop("stack_info", False)
+        if self.fields:
+            fields = {**self.fields, **fields} if fields else self.fields
+        extra = {"log_fields": fields}
+        span_events = self.span_events if self.span_events is not None else get_config().LOG_SPAN_EVENTS
+        if span_events:
+            # Recorded by TraceContextFilter, so records dropped before any handler never become events
+            extra["log_span_event"] = True
+        # stacklevel 3: report the caller of info()/error()/... rather than this method
+        self.logger.log(level, msg, *args, exc_info=exc_info, stack_info=stack_info, stacklevel=3, extra=extra)
+
+
+def _add_log_event(record: logging.LogRecord) -> None:
+    """Add a record, with its request-bound and BoundLogger fields, as a "log" event to the current span."""
+    span = _current_span_var.get()
+    if span is None:
+        return
+    try:
+        message = record.getMessage()
+    except Exception:
+        # Bad format arguments; the formatter reports them through handleError
+        message = str(record.msg)
+    attributes = {"log.severity": record.levelname, "log.message": message}
+    fields = _structured_fields(record)
+    if fields:
+        attributes.update(fields)
+    span.add_event("log", attributes)
 
 
 class TraceLogger:
@@ -15,66 +189,125 @@ class TraceLogger:
     """
 
     def __init__(self, logger_name: str = "fastapi_trace"):
-        self.config = Config()
+        self.config: Config = get_config()
         self.logger = logging.getLogger(logger_name)
-        self.logger.setLevel(logging.INFO)
+        self.logger.setLevel(self.config.LOG_LEVEL)
+        _reload_logger_names.add(logger_name)
+        self.listener: logging.handlers.QueueListener = None
 
         # Avoid adding multiple handlers if logger already configured
         if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = self._create_formatter()
+            if self.config.LOG_FILE:
+                # One JSON object per line, ready for bulk shipping
+                handler = RotatingCompressedFileHandler(
+                    self.config.LOG_FILE,
+                    max_bytes=self.config.LOG_FILE_MAX_BYTES,
+                    rotate_interval=self.config.LOG_FILE_ROTATE_INTERVAL,
+                    backup_count=self.config.LOG_FILE_BACKUP_COUNT,
+                    compression=self.config.LOG_FILE_COMPRESSION,
+                    buffer_size=self.config.LOG_FILE_BUFFER_SIZE,
+                )
+                formatter = self._create_json_formatter()
+            else:
+                handler = logging.StreamHandler()
+                formatter = self._create_formatter()
             handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.addFilter(self._trace_filter)
+            if self.config.LOG_ASYNC:
+                # 调用线程只负责入队，格式化和写出在后台线程完成
+                queue_handler = NonBlockingQueueHandler(
+                    maxsize=self.config.LOG_QUEUE_SIZE,
+                    overflow_policy=self.config.LOG_OVERFLOW_POLICY,
+                )
+                self.listener = logging.handlers.QueueListener(
+                    queue_handler.queue, handler, respect_handler_level=True
+                )
+                self.listener.start()
+                atexit.register(self.shutdown)
+                # Enrich before enqueueing: the trace context is only visible on the caller's thread
+                queue_handler.addFilter(trace_context_filter)
+                self.logger.addHandler(queue_handler)
+            else:
+                handler.addFilter(trace_context_filter)
+                self.logger.addHandler(handler)
 
     def get_logger(self) -> logging.Logger:
         """Return configured logger instance."""
         return self.logger
 
+    def bind(self, **fields: Any) -> BoundLogger:
+        """Structured logger over this logger, carrying fields on every record it logs."""
+        return BoundLogger(self.logger, fields)
+
+    def shutdown(self) -> None:
+        """Flush records still queued by the async backend and stop its thread."""
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            listener.stop()
+
     def _create_formatter(self):
         """Create appropriate formatter based on JSON logging configuration."""
         if self.config.is_json_log_enabled:
-            return JsonFormatter(self.config.LOG_FORMAT)
+            return self._create_json_formatter()
         else:
             return TraceFormatter(self.config.LOG_FORMAT)
 
-    def _trace_filter(self, record: logging.LogRecord) -> bool:
-        """
-        Filter that injects trace_id and span_id into log record.
-        Returns True to allow log record to be processed.
-        """
-        # 添加线程信息
-        record.thread = threading.get_ident()
-        record.threadName = threading.current_thread().name
-
-        try:
-            trace_context = _trace_context_var.get()
-            record.trace_id = trace_context.trace_id
-            # Use last span's span_id if exists, else use parent_span_id
-            current_span_id = "0"
-            if trace_context.spans:
-                # Get the most recently opened (and not yet closed) span
-                for span in reversed(trace_context.spans):
-                    if span.get("end_time") is None:
-                        current_span_id = span["span_id"]
-                        break
-                else:
-                    # If all spans are closed, use the last one
-                    if trace_context.spans:
-                        current_span_id = trace_context.spans[-1]["span_id"]
+    def _create_json_formatter(self) -> "JsonFormatter":
+        return JsonFormatter(
+            self.config.LOG_FORMAT,
+            fields=self.config.LOG_JSON_FIELDS,
+            static_fields=self.config.LOG_JSON_STATIC_FIELDS,
+        )
+
+
+# Loggers set up by TraceLogger, by name so neither instances nor listeners pile up per TraceLogger()
+_reload_logger_names: set = set()
+
+
+def _apply_reloaded_config(config: Config) -> None:
+    """Apply settings that can change without a restart; handlers and formatters keep their startup config."""
+    for name in list(_reload_logger_names):
+        logging.getLogger(name).setLevel(config.LOG_LEVEL)
+
+
+add_reload_listener(_apply_reloaded_config)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that only enqueues records on the caller's thread.
+    trace_id and span_id are already attached by the handler's TraceContextFilter at this point,
+    so the record carries them to the QueueListener thread, which does the formatting and I/O.
+    Uses the lock-free queue.SimpleQueue with a soft size bound and a configurable overflow policy.
+    """
+
+    def __init__(self, maxsize: int = 10000, overflow_policy: str = "drop_new"):
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = max(1, maxsize)
+        self.overflow_policy = overflow_policy
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Skip QueueHandler's eager formatting; the listener thread formats the record."""
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Put the record on the queue, applying the overflow policy when the buffer is full."""
+        if self.queue.qsize() >= self.maxsize:
+            if self.overflow_policy == "drop_oldest":
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
             else:
-                current_span_id = trace_context.parent_span_id
-            record.span_id = current_span_id
-        except LookupError:
-            # No trace context available
-            record.trace_id = "N/A"
-            record.span_id = "N/A"
-        return True
+                self.dropped += 1
+                return
+        self.queue.put_nowait(record)
 
 
 class TraceFormatter(logging.Formatter):
     """
     Custom formatter that includes thread information in traditional log format.
+    Structured fields (see BoundLogger) are appended to the formatted line as key=value pairs.
     """
 
     def format(self, record):
@@ -85,44 +318,135 @@ class TraceFormatter(logging.Formatter):
             record.threadName = threading.current_thread().name
         return super().format(record)
 
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = super().formatMessage(record)
+        fields = _structured_fields(record)
+        if not fields:
+            return message
+        return message + " " + " ".join(f"{key}={value}" for key, value in fields.items())
+
 
 class JsonFormatter(logging.Formatter):
     """
     Custom formatter that outputs logs in JSON format.
     Automatically includes trace_id and span_id when available.
+    Built for throughput: the timestamp prefix is cached per second, static fields are merged
+    once, orjson is used when installed, and an optional field whitelist trims each entry.
+    Structured fields (see BoundLogger and bind_context) become top-level keys; they may override
+    static fields but never the built-in ones, and the whitelist does not apply to them.
     """
 
-    def __init__(self, fmt: str = None):
-        super().__init__(fmt)
+    # Every field the formatter can emit, in output order
+    FIELDS = (
+        "timestamp", "level", "message", "module", "function", "line",
+        "thread_id", "thread_name", "trace_id", "span_id", "exception",
+    )
+
+    def __init__(
+        self,
+        fmt: str = None,
+        datefmt: str = None,
+        fields: Optional[Iterable[str]] = None,
+        static_fields: Optional[Dict[str, Any]] = None,
+        use_orjson: bool = True,
+    ):
+        super().__init__(fmt, datefmt)
         self.fmt = fmt
+        self.fields = frozenset(fields) if fields else None
+        self.static_fields = dict(static_fields) if static_fields else {}
+        self._dumps = _orjson_dumps if (use_orjson and orjson is not None) else _json_dumps
+        self._cached_second = None
+        self._cached_prefix = ""
 
     def format(self, record: logging.LogRecord) -> str:
         """Format the log record as a JSON string."""
-        # 添加线程信息
-        if not hasattr(record, 'thread'):
-            record.thread = threading.get_ident()
-        if not hasattr(record, 'threadName'):
-            record.threadName = threading.current_thread().name
+        log_entry = dict(self.static_fields) if self.static_fields else {}
+        fields = self.fields
 
-        log_entry = {
-            "timestamp": self.formatTime(record, self.datefmt),
-            "level": record.levelname,
-            "message": record.getMessage(),
-            "module": record.module,
-            "function": record.funcName,
-            "line": record.lineno,
-            "thread_id": record.thread,
-            "thread_name": record.threadName,
-        }
+        if fields is None:
+            log_entry["timestamp"] = self._format_timestamp(record)
+            log_entry["level"] = record.levelname
+            log_entry["message"] = record.getMessage()
+            log_entry["module"] = record.module
+            log_entry["function"] = record.funcName
+            log_entry["line"] = record.lineno
+            log_entry["thread_id"] = record.thread
+            log_entry["thread_name"] = record.threadName
+        else:
+            if "timestamp" in fields:
+                log_entry["timestamp"] = self._format_timestamp(record)
+            if "level" in fields:
+                log_entry["level"] = record.levelname
+            if "message" in fields:
+                log_entry["message"] = record.getMessage()
+            if "module" in fields:
+                log_entry["module"] = record.module
+            if "function" in fields:
+                log_entry["function"] = record.funcName
+            if "line" in fields:
+                log_entry["line"] = record.lineno
+            if "thread_id" in fields:
+                log_entry["thread_id"] = record.thread
+            if "thread_name" in fields:
+                log_entry["thread_name"] = record.threadName
 
         # Add trace context if available
-        if hasattr(record, "trace_id"):
-            log_entry["trace_id"] = record.trace_id
-        if hasattr(record, "span_id"):
-            log_entry["span_id"] = record.span_id
+        if fields is None or "trace_id" in fields:
+            trace_id = getattr(record, "trace_id", None)
+            if trace_id is not None:
+                log_entry["trace_id"] = trace_id
+        if fields is None or "span_id" in fields:
+            span_id = getattr(record, "span_id", None)
+            if span_id is not None:
+                log_entry["span_id"] = span_id
 
         # Add exception info if present
-        if record.exc_info:
+        if record.exc_info and (fields is None or "exception" in fields):
             log_entry["exception"] = self.formatException(record.exc_info)
 
-        return json.dumps(log_entry, ensure_ascii=False, separators=(',', ':'))
+        extra = _structured_fields(record)
+        if extra:
+            reserved = _RESERVED_FIELDS
+            for key, value in extra.items():
+                if key not in reserved:
+                    log_entry[key] = value
+
+        return self._dumps(log_entry)
+
+    def _format_timestamp(self, record: logging.LogRecord) -> str:
+        """Same output as formatTime(), but strftime only runs once per second."""
+        second = int(record.created)
+        if second != self._cached_second:
+            # 每秒只调用一次strftime，毫秒部分单独拼接
+            self._cached_prefix = time.strftime(
+                self.datefmt or self.default_time_format, self.converter(second)
+            )
+            self._cached_second = second
+        if self.datefmt:
+            # formatTime() adds milliseconds only to its default format
+            return self._cached_prefix
+        return self.default_msec_format % (self._cached_prefix, record.msecs)
+
+
+_RESERVED_FIELDS = frozenset(JsonFormatter.FIELDS)
+
+
+def _structured_fields(record: logging.LogRecord) -> Optional[Dict[str, Any]]:
+    """Request-bound fields overlaid with the record's own BoundLogger fields, or None."""
+    bound = getattr(record, "bound_fields", None)
+    fields = getattr(record, "log_fields", None)
+    if bound and fields:
+        return {**bound, **fields}
+    return bound or fields
+
+
+# json.dumps() builds a new encoder per call when given options, so build it once
+_json_dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str).encode
+
+
+def _orjson_dumps(log_entry: Dict[str, Any]) -> str:
+    try:
+        return orjson.dumps(log_entry, default=str).decode()
+    except TypeError:
+        # e.g. integers wider than 64 bits; the stdlib handles them
+        return _json_dumps(log_entry)
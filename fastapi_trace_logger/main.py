@@ -4,13 +4,13 @@ import os
 
 from fastapi import FastAPI
 
-from fastapi_trace_logger.config import Config
+from fastapi_trace_logger.config import get_config
 from fastapi_trace_logger.logger import TraceLogger
 from fastapi_trace_logger.trace_middleware import TraceMiddleware, get_current_trace_context
 
 # Initialize global logger
 trace_logger = TraceLogger().get_logger()
-config = Config()
+config = get_config()
 
 # Create FastAPI application
 app = FastAPI(
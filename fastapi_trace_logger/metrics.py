@@ -0,0 +1,181 @@
+# metrics.py
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi_trace_logger.common import Span
+from fastapi_trace_logger.config import get_config
+
+# Prometheus client default buckets, in seconds
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label value used once max_series distinct series exist, so memory stays bounded
+OVERFLOW_LABEL = "__overflow__"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: one counter per bucket plus sum and count."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # Last slot counts observations above the largest bucket (+Inf)
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile by linear interpolation inside the bucket, like histogram_quantile()."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class MetricsAggregator:
+    """
+    In-process RED metrics (rate, errors, duration) fed by finished requests and closed spans.
+    Keeps per-route request counters and latency histograms plus per-route, per-span-name histograms.
+    The number of series per metric is capped by max_series; further label combinations all fold into
+    one series whose labels are all OVERFLOW_LABEL, so client-chosen methods or dynamic span names
+    cannot grow memory either.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = 1000):
+        self.buckets = tuple(sorted(buckets))
+        self.max_series = max(1, max_series)
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, str], int] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._request_durations: Dict[Tuple[str, str], Histogram] = {}
+        self._span_durations: Dict[Tuple[str, str], Histogram] = {}
+
+    def record_request(self, route: str, method: str, status_code: int, duration: float) -> None:
+        """Record one finished HTTP request. Status codes >= 500 count as errors."""
+        with self._lock:
+            key = self._bounded(self._requests, (route, method, str(status_code)))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if status_code >= 500:
+                error_key = self._bounded(self._errors, (route, method))
+                self._errors[error_key] = self._errors.get(error_key, 0) + 1
+            self._histogram(self._request_durations, (route, method)).observe(duration)
+
+    def record_spans(self, route: str, spans: Iterable[Span]) -> None:
+        """Record the durations of closed spans of one trace."""
+        with self._lock:
+            for span in spans:
+                if span.duration is not None:
+                    self._histogram(self._span_durations, (route, span.name)).observe(span.duration)
+
+    def quantile(self, route: str, method: str, q: float) -> Optional[float]:
+        """Estimated request latency quantile (seconds) for a route, e.g. q=0.99 for p99."""
+        with self._lock:
+            histogram = self._request_durations.get((route, method))
+            return histogram.quantile(q) if histogram else None
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            lines.append("# HELP http_requests_total Total HTTP requests by route, method and status.")
+            lines.append("# TYPE http_requests_total counter")
+            for (route, method, status), value in self._requests.items():
+                lines.append(f"http_requests_total{{{_labels(route=route, method=method, status=status)}}} {value}")
+
+            lines.append("# HELP http_request_errors_total HTTP requests that ended with a 5xx status or an exception.")
+            lines.append("# TYPE http_request_errors_total counter")
+            for (route, method), value in self._errors.items():
+                lines.append(f"http_request_errors_total{{{_labels(route=route, method=method)}}} {value}")
+
+            lines.append("# HELP http_request_duration_seconds HTTP request latency.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (route, method), histogram in self._request_durations.items():
+                self._render_histogram(lines, "http_request_duration_seconds", _labels(route=route, method=method), histogram)
+
+            lines.append("# HELP trace_span_duration_seconds Span latency by route and span name.")
+            lines.append("# TYPE trace_span_duration_seconds histogram")
+            for (route, name), histogram in self._span_durations.items():
+                self._render_histogram(lines, "trace_span_duration_seconds", _labels(route=route, span=name), histogram)
+        lines.append("")
+        return "\n".join(lines)
+
+    def _bounded(self, series: dict, key: tuple) -> tuple:
+        """Return key, or the single overflow key if the series limit is reached."""
+        if key in series or len(series) < self.max_series:
+            return key
+        # Fold every label: keeping any of them would let it grow one overflow series per value
+        return (OVERFLOW_LABEL,) * len(key)
+
+    def _histogram(self, series: Dict[tuple, Histogram], key: tuple) -> Histogram:
+        histogram = series.get(key)
+        if histogram is None:
+            key = self._bounded(series, key)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+        return histogram
+
+    def _render_histogram(self, lines: List[str], name: str, labels: str, histogram: Histogram) -> None:
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, histogram.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+class MetricsApp:
+    """
+    Pure ASGI app serving the aggregator in Prometheus text format.
+    Usage: app.mount("/metrics", MetricsApp())
+    """
+
+    def __init__(self, aggregator: Optional[MetricsAggregator] = None):
+        self.aggregator = aggregator or get_metrics_aggregator()
+
+    async def __call__(self, scope, receive, send) -> None:
+        body = self.aggregator.render_prometheus().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+_metrics_aggregator: Optional[MetricsAggregator] = None
+
+
+def get_metrics_aggregator() -> MetricsAggregator:
+    """Process-wide aggregator shared by TraceMiddleware and MetricsApp."""
+    global _metrics_aggregator
+    if _metrics_aggregator is None:
+        config = get_config()
+        _metrics_aggregator = MetricsAggregator(config.METRICS_BUCKETS, config.METRICS_MAX_SERIES)
+    return _metrics_aggregator
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
@@ -0,0 +1,307 @@
+# propagation.py
+import logging
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.config import Config
+from fastapi_trace_logger.ids import new_span_id, span_id_hex
+
+# Called by Propagator.inject for every header it wants to set: setter(name, value)
+HeaderSetter = Callable[[str, str], None]
+
+# Raw ASGI header list that Propagator.inject_asgi appends (lowercase name, value) byte pairs to
+RawHeaders = List[Tuple[bytes, bytes]]
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+class PropagationContext:
+    """
+    Trace identity received from upstream.
+    sampled is None when the upstream did not make (or did not send) a sampling decision.
+    """
+
+    __slots__ = ("trace_id", "parent_span_id", "sampled", "tracestate")
+
+    def __init__(
+        self,
+        trace_id: str,
+        parent_span_id: str = "0",
+        sampled: Optional[bool] = None,
+        tracestate: Optional[str] = None,
+    ):
+        self.trace_id = trace_id
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.tracestate = tracestate
+
+
+class Propagator:
+    """
+    Base class for trace header formats.
+    header_names lists the lowercase header names extract() reads, so the middleware can
+    collect exactly those in a single pass over the raw request headers, and stop early
+    once has_all_headers() says nothing more would change the result.
+    """
+
+    header_names: FrozenSet[bytes] = frozenset()
+
+    def extract(self, headers: Dict[bytes, bytes]) -> Optional[PropagationContext]:
+        """Read trace identity from the collected headers, or return None if absent/invalid."""
+        raise NotImplementedError
+
+    def has_all_headers(self, headers: Dict[bytes, bytes]) -> bool:
+        """True once headers holds everything extract() can use, so collecting may stop."""
+        return len(headers) >= len(self.header_names) and self.header_names.issubset(headers)
+
+    def inject(self, trace_context: TraceContext, span_id: Optional[str], setter: HeaderSetter) -> None:
+        """Write trace identity for trace_context, with span_id as the parent of the next hop."""
+        raise NotImplementedError
+
+    def inject_asgi(self, trace_context: TraceContext, span_id: Optional[str], headers: RawHeaders) -> None:
+        """
+        Like inject(), but appends pre-encoded (name, value) pairs to a raw ASGI header list.
+        Pass a list owned by the caller, not one taken from an app's response.
+        """
+        raise NotImplementedError
+
+
+class TraceHeaderPropagator(Propagator):
+    """The original custom format: TRACE_HEADER_NAME plus x-parent-span-id."""
+
+    def __init__(self, trace_header_name: str = "X-Trace-ID", parent_header_name: str = "x-parent-span-id"):
+        self.trace_header_name = trace_header_name
+        self.parent_header_name = parent_header_name
+        self._trace_key = trace_header_name.lower().encode("latin-1")
+        self._parent_key = parent_header_name.lower().encode("latin-1")
+        self.header_names = frozenset((self._trace_key, self._parent_key))
+
+    def extract(self, headers: Dict[bytes, bytes]) -> Optional[PropagationContext]:
+        trace_id = headers.get(self._trace_key)
+        if not trace_id:
+            return None
+        parent_span_id = headers.get(self._parent_key)
+        return PropagationContext(
+            trace_id.decode("latin-1"),
+            parent_span_id.decode("latin-1") if parent_span_id else "0",
+        )
+
+    def inject(self, trace_context: TraceContext, span_id: Optional[str], setter: HeaderSetter) -> None:
+        setter(self.trace_header_name, trace_context.trace_id)
+        if span_id:
+            setter(self.parent_header_name, span_id)
+
+    def inject_asgi(self, trace_context: TraceContext, span_id: Optional[str], headers: RawHeaders) -> None:
+        headers.append((self._trace_key, trace_context.trace_id.encode("latin-1")))
+        if span_id:
+            headers.append((self._parent_key, span_id.encode("latin-1")))
+
+
+class W3CTraceContextPropagator(Propagator):
+    """W3C Trace Context: traceparent (version-traceid-parentid-flags) and tracestate."""
+
+    header_names = frozenset((b"traceparent", b"tracestate"))
+
+    def extract(self, headers: Dict[bytes, bytes]) -> Optional[PropagationContext]:
+        traceparent = headers.get(b"traceparent")
+        if not traceparent:
+            return None
+        parts = traceparent.decode("latin-1").strip().lower().split("-")
+        if len(parts) < 4 or parts[0] == "ff" or (parts[0] == "00" and len(parts) != 4):
+            return None
+        version, trace_id, parent_id, flags = parts[:4]
+        if (
+            len(version) != 2 or len(flags) != 2 or not _is_hex(version + flags)
+            or not _is_valid_id(trace_id, 32) or not _is_valid_id(parent_id, 16)
+        ):
+            return None
+        tracestate = headers.get(b"tracestate")
+        return PropagationContext(
+            trace_id,
+            parent_id,
+            sampled=bool(int(flags, 16) & 0x01),
+            tracestate=tracestate.decode("latin-1") if tracestate else None,
+        )
+
+    def inject(self, trace_context: TraceContext, span_id: Optional[str], setter: HeaderSetter) -> None:
+        traceparent = self._traceparent(trace_context, span_id)
+        if traceparent is None:
+            return
+        setter("traceparent", traceparent)
+        if trace_context.tracestate:
+            setter("tracestate", trace_context.tracestate)
+
+    def inject_asgi(self, trace_context: TraceContext, span_id: Optional[str], headers: RawHeaders) -> None:
+        traceparent = self._traceparent(trace_context, span_id)
+        if traceparent is None:
+            return
+        headers.append((b"traceparent", traceparent.encode("latin-1")))
+        if trace_context.tracestate:
+            headers.append((b"tracestate", trace_context.tracestate.encode("latin-1")))
+
+    @staticmethod
+    def _traceparent(trace_context: TraceContext, span_id: Optional[str]) -> Optional[str]:
+        trace_id = _to_hex_trace_id(trace_context.trace_id)
+        if trace_id is None:
+            # Non-hex custom trace ids cannot be expressed as a traceparent
+            return None
+        if not span_id or not _is_valid_id(span_id, 16):
+            span_id = span_id_hex(new_span_id())
+        return f"00-{trace_id}-{span_id}-{'01' if trace_context.sampled else '00'}"
+
+
+class B3Propagator(Propagator):
+    """
+    Zipkin B3 propagation. Extracts both the single `b3` header and the X-B3-* multi headers;
+    injects the single header unless single_header is False.
+    """
+
+    header_names = frozenset((b"b3", b"x-b3-traceid", b"x-b3-spanid", b"x-b3-sampled", b"x-b3-flags"))
+
+    def __init__(self, single_header: bool = True):
+        self.single_header = single_header
+
+    def has_all_headers(self, headers: Dict[bytes, bytes]) -> bool:
+        # The single header takes precedence over the multi headers
+        return b"b3" in headers or super().has_all_headers(headers)
+
+    def extract(self, headers: Dict[bytes, bytes]) -> Optional[PropagationContext]:
+        single = headers.get(b"b3")
+        if single:
+            return self._extract_single(single.decode("latin-1").strip().lower())
+        trace_id = headers.get(b"x-b3-traceid")
+        span_id = headers.get(b"x-b3-spanid")
+        if not trace_id or not span_id:
+            return None
+        trace_id = trace_id.decode("latin-1").lower()
+        span_id = span_id.decode("latin-1").lower()
+        if not _is_valid_b3_trace_id(trace_id) or not _is_valid_id(span_id, 16):
+            return None
+        sampled = None
+        if headers.get(b"x-b3-flags") == b"1":
+            sampled = True
+        else:
+            sampled_value = headers.get(b"x-b3-sampled")
+            if sampled_value is not None:
+                sampled = sampled_value.lower() in (b"1", b"true", b"d")
+        return PropagationContext(trace_id.rjust(32, "0"), span_id, sampled=sampled)
+
+    @staticmethod
+    def _extract_single(value: str) -> Optional[PropagationContext]:
+        # b3: {TraceId}-{SpanId}-{SamplingState}-{ParentSpanId}, or just {SamplingState}
+        parts = value.split("-")
+        if len(parts) == 1:
+            # A bare sampling decision carries no ids; nothing to continue from
+            return None
+        trace_id, span_id = parts[0], parts[1]
+        if not _is_valid_b3_trace_id(trace_id) or not _is_valid_id(span_id, 16):
+            return None
+        sampled = None
+        if len(parts) > 2:
+            sampled = parts[2] in ("1", "d")
+        return PropagationContext(trace_id.rjust(32, "0"), span_id, sampled=sampled)
+
+    def inject(self, trace_context: TraceContext, span_id: Optional[str], setter: HeaderSetter) -> None:
+        ids = self._ids(trace_context, span_id)
+        if ids is None:
+            return
+        trace_id, span_id, sampled = ids
+        if self.single_header:
+            setter("b3", f"{trace_id}-{span_id}-{sampled}")
+        else:
+            setter("X-B3-TraceId", trace_id)
+            setter("X-B3-SpanId", span_id)
+            setter("X-B3-Sampled", sampled)
+
+    def inject_asgi(self, trace_context: TraceContext, span_id: Optional[str], headers: RawHeaders) -> None:
+        ids = self._ids(trace_context, span_id)
+        if ids is None:
+            return
+        trace_id, span_id, sampled = ids
+        if self.single_header:
+            headers.append((b"b3", f"{trace_id}-{span_id}-{sampled}".encode("latin-1")))
+        else:
+            headers.append((b"x-b3-traceid", trace_id.encode("latin-1")))
+            headers.append((b"x-b3-spanid", span_id.encode("latin-1")))
+            headers.append((b"x-b3-sampled", sampled.encode("latin-1")))
+
+    @staticmethod
+    def _ids(trace_context: TraceContext, span_id: Optional[str]) -> Optional[Tuple[str, str, str]]:
+        """(trace id, span id, sampling state) as B3 renders them, or None for a non-hex trace id."""
+        trace_id = _to_hex_trace_id(trace_context.trace_id)
+        if trace_id is None:
+            return None
+        if not span_id or not _is_valid_id(span_id, 16):
+            span_id = span_id_hex(new_span_id())
+        return trace_id, span_id, "1" if trace_context.sampled else "0"
+
+
+class CompositePropagator(Propagator):
+    """
+    Tries each propagator in order on extract; all of them inject.
+    Header collection may stop as soon as the first (highest-precedence) propagator has all its headers.
+    """
+
+    def __init__(self, propagators: List[Propagator]):
+        self.propagators = propagators
+        self.header_names = frozenset().union(*(p.header_names for p in propagators))
+
+    def extract(self, headers: Dict[bytes, bytes]) -> Optional[PropagationContext]:
+        if not headers:
+            return None
+        for propagator in self.propagators:
+            context = propagator.extract(headers)
+            if context is not None:
+                return context
+        return None
+
+    def has_all_headers(self, headers: Dict[bytes, bytes]) -> bool:
+        return bool(self.propagators) and self.propagators[0].has_all_headers(headers)
+
+    def inject(self, trace_context: TraceContext, span_id: Optional[str], setter: HeaderSetter) -> None:
+        for propagator in self.propagators:
+            propagator.inject(trace_context, span_id, setter)
+
+    def inject_asgi(self, trace_context: TraceContext, span_id: Optional[str], headers: RawHeaders) -> None:
+        for propagator in self.propagators:
+            propagator.inject_asgi(trace_context, span_id, headers)
+
+
+def create_propagator(config: Config) -> CompositePropagator:
+    """Build the propagators listed in PROPAGATORS, in precedence order."""
+    propagators: List[Propagator] = []
+    for name in config.PROPAGATORS:
+        if name == "tracecontext":
+            propagators.append(W3CTraceContextPropagator())
+        elif name == "b3":
+            propagators.append(B3Propagator(single_header=True))
+        elif name == "b3multi":
+            propagators.append(B3Propagator(single_header=False))
+        elif name == "legacy":
+            propagators.append(TraceHeaderPropagator(config.TRACE_HEADER_NAME))
+        else:
+            logging.getLogger(__name__).warning(f"Unknown propagator {name!r} in PROPAGATORS, ignoring it")
+    return CompositePropagator(propagators)
+
+
+def _is_hex(value: str) -> bool:
+    return bool(value) and _HEX_DIGITS.issuperset(value)
+
+
+def _is_valid_id(value: str, length: int) -> bool:
+    """Lowercase hex of the given length and not all zeros, as both W3C and B3 require."""
+    return len(value) == length and _is_hex(value) and value.strip("0") != ""
+
+
+def _is_valid_b3_trace_id(value: str) -> bool:
+    return _is_valid_id(value, 32) or _is_valid_id(value, 16)
+
+
+def _to_hex_trace_id(trace_id: str) -> Optional[str]:
+    """Render a trace id as 32 hex chars (uuid strings lose their dashes), or None if it is not hex."""
+    value = trace_id.replace("-", "").lower()
+    if len(value) == 16:
+        value = value.rjust(32, "0")
+    if _is_valid_id(value, 32):
+        return value
+    return None
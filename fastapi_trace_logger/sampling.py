@@ -0,0 +1,118 @@
+# sampling.py
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+from fastapi_trace_logger.common import STATUS_ERROR, TraceContext
+from fastapi_trace_logger.config import Config
+
+
+class Sampler:
+    """
+    Base class for head sampling policies.
+    TraceMiddleware asks the sampler once per request, before any span is recorded.
+    """
+
+    def should_sample(self, trace_id: str) -> bool:
+        raise NotImplementedError
+
+
+class AlwaysOnSampler(Sampler):
+    """Record every request."""
+
+    def should_sample(self, trace_id: str) -> bool:
+        return True
+
+
+class AlwaysOffSampler(Sampler):
+    """Record no requests (trace ids are still propagated and logged)."""
+
+    def should_sample(self, trace_id: str) -> bool:
+        return False
+
+
+class ProbabilisticSampler(Sampler):
+    """Record a fixed fraction of requests."""
+
+    def __init__(self, rate: float):
+        self.rate = min(1.0, max(0.0, rate))
+
+    def should_sample(self, trace_id: str) -> bool:
+        return random.random() < self.rate
+
+
+class RateLimitingSampler(Sampler):
+    """
+    Record at most max_traces_per_second requests, using a token bucket
+    so short bursts up to one second's worth of traces are still sampled.
+    """
+
+    def __init__(self, max_traces_per_second: float):
+        self.rate = max(0.0, max_traces_per_second)
+        self.capacity = max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def should_sample(self, trace_id: str) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class TailSampler:
+    """
+    Export decision made when a recorded request finishes.
+    Keeps every errored request (failed request or any span with error status),
+    every request slower than the latency threshold, and a configurable fraction of the rest.
+    """
+
+    def __init__(self, latency_threshold: float, sample_rate: float, keep_errors: bool = True):
+        self.latency_threshold = latency_threshold
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self.keep_errors = keep_errors
+
+    def should_keep(self, trace_context: TraceContext, duration: float) -> bool:
+        """
+        Args:
+            trace_context: Finished TraceContext
+            duration: Request duration in seconds
+        """
+        if duration >= self.latency_threshold:
+            return True
+        if self.keep_errors and (
+            trace_context.error or any(span.status == STATUS_ERROR for span in trace_context.spans)
+        ):
+            return True
+        return random.random() < self.sample_rate
+
+
+def create_sampler(config: Config) -> Sampler:
+    """Build the head sampler selected by SAMPLER_TYPE / SAMPLER_PARAM."""
+    sampler_type = config.SAMPLER_TYPE
+    param = config.SAMPLER_PARAM
+    if sampler_type == "const":
+        return AlwaysOnSampler() if param >= 1 else AlwaysOffSampler()
+    if sampler_type == "probabilistic":
+        return ProbabilisticSampler(param)
+    if sampler_type == "ratelimiting":
+        return RateLimitingSampler(param)
+    logging.getLogger(__name__).warning(f"Unknown SAMPLER_TYPE {sampler_type!r}, sampling every request")
+    return AlwaysOnSampler()
+
+
+def create_tail_sampler(config: Config) -> Optional[TailSampler]:
+    """Build the tail sampler if TAIL_SAMPLING_ENABLED is set."""
+    if not config.TAIL_SAMPLING_ENABLED:
+        return None
+    return TailSampler(
+        latency_threshold=config.TAIL_SAMPLING_LATENCY_THRESHOLD_MS / 1000.0,
+        sample_rate=config.TAIL_SAMPLING_RATE,
+    )
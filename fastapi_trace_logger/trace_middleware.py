@@ -1,17 +1,28 @@
 # trace_middleware.py
 import asyncio
+import atexit
 import contextvars
-import uuid
+import random
+import time
+from typing import Callable, Dict, Optional
 
 from starlette.types import ASGIApp, Receive, Scope, Send
 
-from fastapi_trace_logger.common import TraceContext
-from fastapi_trace_logger.config import Config
-from fastapi_trace_logger.exporter import JaegerExporter
+from fastapi_trace_logger.common import STATUS_ERROR, TraceContext, _current_span_var, configure_limits
+from fastapi_trace_logger.config import Config, get_config
+from fastapi_trace_logger.export_processor import BatchExportProcessor
+from fastapi_trace_logger.exporter import create_exporter
+from fastapi_trace_logger.metrics import get_metrics_aggregator
+from fastapi_trace_logger.propagation import create_propagator
+from fastapi_trace_logger.sampling import create_sampler, create_tail_sampler
+from fastapi_trace_logger.trace_store import SKIP_STORE_SCOPE_KEY, StoredTrace, get_trace_store
 
 # Async context variable to hold current TraceContext instance
 _trace_context_var: contextvars.ContextVar = contextvars.ContextVar("trace_context")
 
+# Export entry point of the most recently created middleware with an exporter, used by submit_trace()
+_trace_sink: Optional[Callable[[TraceContext], None]] = None
+
 
 def get_current_trace_context() -> TraceContext:
     """Get current trace context from async context, raise LookupError if not set."""
@@ -21,75 +32,382 @@ def get_current_trace_context() -> TraceContext:
         raise LookupError("No trace context found in current async context")
 
 
+def submit_trace(trace_context: TraceContext) -> None:
+    """
+    Hand a finished TraceContext created outside a request (e.g. by a background task)
+    to the export pipeline, applying tail sampling. Does nothing if no exporter is configured.
+    """
+    if _trace_sink is not None:
+        _trace_sink(trace_context)
+
+
 class TraceMiddleware:
     """
     ASGI middleware that injects trace context into HTTP requests and propagates trace headers.
-    Automatically exports trace data to Jaeger if enabled.
-    Complies with ASGI specification and supports optional performance tracing.
+    Trace headers are read and written by the propagators listed in PROPAGATORS (W3C, B3, legacy).
+    Automatically exports trace data to Jaeger or an OTLP collector if enabled, through a background batching pipeline.
+    Complies with ASGI specification and supports optional performance tracing: the root span of an HTTP
+    request ends with the last response body chunk, so streamed responses are timed in full,
+    and websocket connections are traced as one session span.
+    Head sampling decides per request whether spans are recorded, unless upstream already decided;
+    tail sampling decides whether they are exported.
     """
 
     def __init__(self, app: ASGIApp, enable_performance: bool = False):
         self.app = app
         self.enable_performance = enable_performance
-        self.config = Config()
-        self.exporter = (
-            JaegerExporter(self.config) if self.config.is_jaeger_enabled else None
+        self.config: Config = None
+        self._apply_config(get_config())
+        self.exporter = create_exporter(self.config)
+        self.metrics = get_metrics_aggregator() if self.config.ENABLE_METRICS else None
+        self.trace_store = get_trace_store() if self.config.TRACE_STORE_ENABLED else None
+        self.export_processor = None
+        if self.exporter:
+            self.export_processor = BatchExportProcessor(
+                self.exporter,
+                max_queue_size=self.config.EXPORT_QUEUE_SIZE,
+                max_batch_size=self.config.EXPORT_BATCH_SIZE,
+                flush_interval=self.config.EXPORT_FLUSH_INTERVAL,
+                drop_on_overflow=self.config.EXPORT_DROP_ON_OVERFLOW,
+                enqueue_timeout=self.config.EXPORT_ENQUEUE_TIMEOUT,
+            )
+            # Last-resort drain for servers that never send lifespan events
+            atexit.register(self.shutdown)
+            global _trace_sink
+            _trace_sink = self._submit
+
+    def _apply_config(self, config: Config) -> None:
+        """
+        Adopt a config snapshot: span limits, propagators and samplers follow reload_config().
+        The exporter, export pipeline and metrics keep the settings they were started with.
+        """
+        self.config = config
+        configure_limits(
+            max_spans_per_trace=config.MAX_SPANS_PER_TRACE,
+            max_span_attributes=config.MAX_SPAN_ATTRIBUTES,
+            max_span_events=config.MAX_SPAN_EVENTS,
+            max_attribute_length=config.MAX_ATTRIBUTE_LENGTH,
+            aggregate_repeated_spans=config.AGGREGATE_REPEATED_SPANS,
         )
+        self.propagator = create_propagator(config)
+        # ASGI header names are lowercase bytes; the propagators precompute theirs once
+        self.propagation_header_names = self.propagator.header_names
+        self.sampler = create_sampler(config)
+        self.tail_sampler = create_tail_sampler(config)
+
+    def shutdown(self) -> None:
+        """Drain queued traces to the exporter and stop the export worker."""
+        if self.export_processor:
+            self.export_processor.shutdown(self.config.EXPORT_SHUTDOWN_TIMEOUT)
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan" and self.export_processor:
+            return await self.app(scope, receive, self._lifespan_send(send))
+        if scope["type"] == "websocket":
+            return await self._handle_websocket(scope, receive, send)
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
+        config = get_config()
+        if config is not self.config:
+            self._apply_config(config)
 
-        # Extract trace_id and parent_span_id from headers
-        headers = dict(scope.get("headers", []))
-        trace_header_name = self.config.TRACE_HEADER_NAME.lower().encode()
-        parent_header_name = b"x-parent-span-id"
-
-        trace_id_bytes = headers.get(trace_header_name)
-        parent_span_id_bytes = headers.get(parent_header_name)
-
-        trace_id = (
-            trace_id_bytes.decode() if trace_id_bytes else str(uuid.uuid4())
-        )
-        parent_span_id = (
-            parent_span_id_bytes.decode() if parent_span_id_bytes else "0"
-        )
-
-        # Initialize trace context
-        trace_context = TraceContext(trace_id=trace_id, parent_span_id=parent_span_id)
+        trace_context = self._start_trace_context(scope)
         token = _trace_context_var.set(trace_context)
+        # Never inherit an active span from whatever context the server runs us in
+        span_token = _current_span_var.set(None)
+        request_start = time.perf_counter()
+        status_code = 500
 
         # Optionally auto-create root span for the HTTP request
         root_span = None
-        if self.enable_performance:
+        if self.enable_performance and trace_context.sampled:
             # HTTP请求的根span，父ID为从header中获取的parent_span_id
-            root_span = trace_context.new_span("http_request", parent_span_id)
+            root_span = trace_context.new_span("http_request", trace_context.parent_span_id)
+            root_span.set_attribute("http.method", scope.get("method", ""))
+            root_span.set_attribute("http.target", scope.get("path", ""))
+        first_byte_at = None
+        bytes_sent = 0
+        # When the last body chunk went out; background tasks may keep the app running well after it
+        response_end = None
 
-        # Wrap send to inject trace header and close root span
+        # Wrap send to inject trace header, and close the root span once the last body chunk is sent
         async def wrapped_send(message):
-            if message["type"] == "http.response.start":
-                response_headers = message.get("headers", [])
-                # Inject trace_id into response headers
-                response_headers.append(
-                    (trace_header_name, trace_context.trace_id.encode())
-                )
-                message["headers"] = response_headers
-
-                # Close root span if performance tracing is enabled
-                if self.enable_performance and root_span:
-                    trace_context.close_span(root_span)
+            nonlocal status_code, first_byte_at, bytes_sent, response_end
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                status_code = message.get("status", 200)
+                self._inject_response_headers(message, trace_context, root_span)
+                if status_code >= 500:
+                    trace_context.error = True
+            elif message_type == "http.response.body":
+                if root_span is not None:
+                    if first_byte_at is None:
+                        first_byte_at = time.perf_counter()
+                    bytes_sent += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    # Streaming bodies end here, not at response start
+                    await send(message)
+                    response_end = time.perf_counter()
+                    if root_span is not None:
+                        self._finish_root_span(
+                            scope, trace_context, root_span, status_code, first_byte_at - request_start, bytes_sent
+                        )
+                    return
+            elif message_type == "http.response.pathsend":
+                # File sent by the server itself (ASGI pathsend extension); nothing more follows
+                first_byte_at = time.perf_counter()
+                await send(message)
+                response_end = time.perf_counter()
+                if root_span is not None:
+                    self._finish_root_span(scope, trace_context, root_span, status_code, first_byte_at - request_start)
+                return
 
             await send(message)
 
         try:
             await self.app(scope, receive, wrapped_send)
-        except Exception:
+        except Exception as e:
+            trace_context.error = True
+            status_code = 500
+            if root_span is not None:
+                root_span.record_exception(e)
             raise
         finally:
-            # Export trace data if exporter is enabled and spans exist
-            if self.exporter and trace_context.spans:
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, self.exporter.export, trace_context)
+            if root_span is not None and root_span.end_time is None:
+                # App failed or the client went away before the final body chunk
+                self._finish_root_span(
+                    scope, trace_context, root_span, status_code,
+                    first_byte_at - request_start if first_byte_at is not None else None, bytes_sent,
+                )
+            # Request latency ends with the response, like the root span; only fall back to now without one
+            duration = (response_end if response_end is not None else time.perf_counter()) - request_start
+            if self.metrics:
+                self._record_metrics(scope, trace_context, status_code, duration)
+            if self.trace_store is not None and not scope.get(SKIP_STORE_SCOPE_KEY):
+                error = trace_context.error or any(span.status == STATUS_ERROR for span in trace_context.spans)
+                self.trace_store.add(StoredTrace(
+                    trace_context, _route_template(scope), scope.get("method", ""), status_code, duration, error
+                ))
+            self._submit(trace_context, duration)
 
             # Clean up context
+            _current_span_var.reset(span_token)
+            _trace_context_var.reset(token)
+
+    async def _handle_websocket(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Trace a websocket connection as one websocket_session root span covering the whole session.
+        Message counts and sizes are recorded on the session span; a WS_MESSAGE_SAMPLE_RATE fraction
+        of individual messages is also recorded as span events.
+        """
+        config = get_config()
+        if config is not self.config:
+            self._apply_config(config)
+        trace_context = self._start_trace_context(scope)
+        token = _trace_context_var.set(trace_context)
+        span_token = _current_span_var.set(None)
+
+        session_span = None
+        if self.enable_performance and trace_context.sampled:
+            session_span = trace_context.new_span("websocket_session", trace_context.parent_span_id)
+            session_span.set_attribute("websocket.target", scope.get("path", ""))
+        sample_rate = self.config.WS_MESSAGE_SAMPLE_RATE
+        counters = {"received": 0, "sent": 0, "bytes_received": 0, "bytes_sent": 0}
+        close_code = None
+
+        def record_message(direction: str, message) -> None:
+            data = message.get("bytes")
+            if data is None:
+                # Text frames travel UTF-8 encoded; count bytes, not characters
+                text = message.get("text")
+                size = len(text.encode("utf-8")) if text else 0
+            else:
+                size = len(data)
+            counters[direction] += 1
+            counters["bytes_" + direction] += size
+            if sample_rate and (sample_rate >= 1.0 or random.random() < sample_rate):
+                session_span.add_event(
+                    "websocket." + ("receive" if direction == "received" else "send"),
+                    {"message.size": size, "message.seq": counters[direction]},
+                )
+
+        async def wrapped_receive():
+            nonlocal close_code
+            message = await receive()
+            if session_span is not None:
+                if message["type"] == "websocket.receive":
+                    record_message("received", message)
+                elif message["type"] == "websocket.disconnect":
+                    close_code = message.get("code", 1000)
+            return message
+
+        async def wrapped_send(message):
+            nonlocal close_code
+            message_type = message["type"]
+            if message_type == "websocket.accept":
+                self._inject_response_headers(message, trace_context, session_span)
+            elif session_span is not None:
+                if message_type == "websocket.send":
+                    record_message("sent", message)
+                elif message_type == "websocket.close":
+                    close_code = message.get("code", 1000)
+            await send(message)
+
+        try:
+            await self.app(scope, wrapped_receive, wrapped_send)
+        except Exception as e:
+            trace_context.error = True
+            if session_span is not None:
+                session_span.record_exception(e)
+            raise
+        finally:
+            if session_span is not None:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    session_span.set_attribute("websocket.route", route)
+                session_span.set_attribute("websocket.messages_received", counters["received"])
+                session_span.set_attribute("websocket.messages_sent", counters["sent"])
+                session_span.set_attribute("websocket.bytes_received", counters["bytes_received"])
+                session_span.set_attribute("websocket.bytes_sent", counters["bytes_sent"])
+                if close_code is not None:
+                    session_span.set_attribute("websocket.close_code", close_code)
+                    # 1011: the server hit an unexpected condition
+                    if close_code == 1011 and session_span.status is None:
+                        session_span.set_status(STATUS_ERROR, "websocket closed with 1011")
+                trace_context.close_span(session_span)
+            if self.metrics and trace_context.spans:
+                self.metrics.record_spans(_route_template(scope), trace_context.spans)
+            self._submit(trace_context)
+
+            _current_span_var.reset(span_token)
             _trace_context_var.reset(token)
+
+    def _start_trace_context(self, scope: Scope) -> TraceContext:
+        """Build the TraceContext of an incoming connection from its propagation headers and the head sampler."""
+        # Extract trace_id, parent_span_id and the upstream sampling decision from headers
+        upstream = None
+        headers = self._collect_propagation_headers(scope)
+        if headers is not None:
+            upstream = self.propagator.extract(headers)
+            if upstream is None and self.propagator.has_all_headers(headers):
+                # The first propagator's headers were invalid; a lower-precedence one may be further down
+                upstream = self.propagator.extract(self._collect_propagation_headers(scope, stop_early=False))
+        if upstream is None:
+            # New trace; TraceContext generates the id
+            trace_context = TraceContext()
+            sampled = None
+        else:
+            trace_context = TraceContext(trace_id=upstream.trace_id, parent_span_id=upstream.parent_span_id)
+            trace_context.tracestate = upstream.tracestate
+            sampled = upstream.sampled
+
+        # Honor the upstream decision; only decide here when nobody upstream did.
+        # Unsampled requests skip span bookkeeping entirely
+        if sampled is None:
+            sampled = self.sampler.should_sample(trace_context.trace_id)
+        trace_context.sampled = sampled
+        return trace_context
+
+    def _inject_response_headers(self, message, trace_context: TraceContext, root_span) -> None:
+        """
+        Add propagation headers to a response start / websocket accept message.
+        The app's header list is never mutated: frameworks reuse it (Starlette's Response.raw_headers)
+        across sends, so the message gets a new list instead.
+        """
+        injected = []
+        self.propagator.inject_asgi(trace_context, root_span.span_id if root_span else None, injected)
+        if injected:
+            message["headers"] = [*message.get("headers", ()), *injected]
+
+    def _submit(self, trace_context: TraceContext, duration: Optional[float] = None) -> None:
+        """
+        Hand trace data to the background exporter; never wait for it on the event loop.
+        duration is the request latency for tail sampling, defaulting to the time since the trace started.
+        """
+        processor = self.export_processor
+        if not (processor and trace_context.spans and self._keep(trace_context, duration)):
+            return
+        if processor.drop_on_overflow:
+            processor.submit(trace_context)
+            return
+        if processor.offer(trace_context):
+            return
+        # Queue full and EXPORT_DROP_ON_OVERFLOW is off: wait for room on a worker thread
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a plain thread (e.g. a threaded background job), where waiting is fine
+            processor.submit(trace_context)
+            return
+        loop.run_in_executor(None, processor.submit, trace_context)
+
+    def _collect_propagation_headers(self, scope: Scope, stop_early: bool = True) -> Optional[Dict[bytes, bytes]]:
+        """
+        Single pass over the raw ASGI header list, keeping only the headers the propagators read.
+        Stops once the highest-precedence propagator has all of its headers, since it wins extraction.
+        Returns None, without allocating anything, when the request carries no trace headers.
+        """
+        wanted = self.propagation_header_names
+        found: Optional[Dict[bytes, bytes]] = None
+        for name, value in scope.get("headers", ()):
+            if name in wanted:
+                if found is None:
+                    found = {name: value}
+                elif name in found:
+                    continue
+                else:
+                    found[name] = value
+                if stop_early and self.propagator.has_all_headers(found):
+                    break
+        return found
+
+    def _finish_root_span(
+        self,
+        scope: Scope,
+        trace_context: TraceContext,
+        root_span,
+        status_code: int,
+        time_to_first_byte: Optional[float] = None,
+        bytes_sent: Optional[int] = None,
+    ) -> None:
+        """Record route, status, time to first body byte and body size on the request's root span and close it."""
+        route = getattr(scope.get("route"), "path", None)
+        if route:
+            root_span.set_attribute("http.route", route)
+        root_span.set_attribute("http.status_code", status_code)
+        if time_to_first_byte is not None:
+            root_span.set_attribute("http.time_to_first_byte_ms", round(time_to_first_byte * 1000, 3))
+        if bytes_sent is not None:
+            root_span.set_attribute("http.response_content_length", bytes_sent)
+        if status_code >= 500 and root_span.status is None:
+            root_span.set_status(STATUS_ERROR, f"HTTP {status_code}")
+        trace_context.close_span(root_span)
+
+    def _record_metrics(self, scope: Scope, trace_context: TraceContext, status_code: int, duration: float) -> None:
+        """Feed request counters/latency, and closed span latencies of recorded traces, to the aggregator."""
+        route = _route_template(scope)
+        self.metrics.record_request(route, scope.get("method", ""), status_code, duration)
+        if trace_context.spans:
+            self.metrics.record_spans(route, trace_context.spans)
+
+    def _keep(self, trace_context: TraceContext, duration: Optional[float] = None) -> bool:
+        """Apply tail sampling to a finished, recorded request."""
+        if self.tail_sampler is None:
+            return True
+        return self.tail_sampler.should_keep(trace_context, trace_context.elapsed() if duration is None else duration)
+
+    def _lifespan_send(self, send: Send) -> Send:
+        """Wrap lifespan send so queued traces are drained before shutdown completes."""
+
+        async def wrapped_send(message):
+            if message["type"] == "lifespan.shutdown.complete":
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.shutdown)
+            await send(message)
+
+        return wrapped_send
+
+
+def _route_template(scope: Scope) -> str:
+    """Route template (e.g. /items/{id}) set by the router; raw paths would explode label cardinality."""
+    return getattr(scope.get("route"), "path", None) or "unmatched"
@@ -0,0 +1,205 @@
+# trace_store.py
+import heapq
+import json
+import threading
+import urllib.parse
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.config import get_config
+
+# Set in the ASGI scope by TraceStoreApp so TraceMiddleware does not fill the store with its own queries.
+# Routers (including Starlette's Mount) pass the same scope dict down, so the middleware sees the mark.
+SKIP_STORE_SCOPE_KEY = "fastapi_trace_logger.skip_trace_store"
+
+
+class StoredTrace:
+    """One finished request kept by TraceStore; spans stay empty for unsampled requests."""
+
+    __slots__ = ("trace_context", "route", "method", "status_code", "duration", "error")
+
+    def __init__(
+        self, trace_context: TraceContext, route: str, method: str, status_code: int, duration: float, error: bool
+    ):
+        self.trace_context = trace_context
+        self.route = route
+        self.method = method
+        self.status_code = status_code
+        self.duration = duration
+        self.error = error
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace_context.trace_id
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "route": self.route,
+            "method": self.method,
+            "status_code": self.status_code,
+            "start_time": self.trace_context.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "span_count": len(self.trace_context.spans),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = self.summary()
+        result["spans"] = [span.to_dict() for span in self.trace_context.spans]
+        return result
+
+
+class TraceStore:
+    """
+    Bounded ring buffer of the most recent finished requests, for local debugging without a tracing backend.
+    Holds at most capacity traces; adding one overwrites the oldest in O(1).
+    Traces are indexed by trace_id and by route; duration queries scan the (route-filtered) buffer,
+    which keeps insertion cheap and costs O(capacity) only when someone asks.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._slots: List[Optional[StoredTrace]] = [None] * self.capacity
+        self._next = 0
+        self._by_trace_id: Dict[str, int] = {}
+        self._by_route: Dict[str, Set[int]] = {}
+
+    def add(self, stored: StoredTrace) -> None:
+        """Store a finished request, evicting the oldest one when full."""
+        with self._lock:
+            slot = self._next
+            self._next = (slot + 1) % self.capacity
+            evicted = self._slots[slot]
+            if evicted is not None:
+                if self._by_trace_id.get(evicted.trace_id) == slot:
+                    del self._by_trace_id[evicted.trace_id]
+                route_slots = self._by_route[evicted.route]
+                route_slots.discard(slot)
+                if not route_slots:
+                    del self._by_route[evicted.route]
+            self._slots[slot] = stored
+            self._by_trace_id[stored.trace_id] = slot
+            self._by_route.setdefault(stored.route, set()).add(slot)
+
+    def get(self, trace_id: str) -> Optional[StoredTrace]:
+        with self._lock:
+            slot = self._by_trace_id.get(trace_id)
+            return self._slots[slot] if slot is not None else None
+
+    def routes(self) -> Dict[str, int]:
+        """Number of stored traces per route."""
+        with self._lock:
+            return {route: len(slots) for route, slots in self._by_route.items()}
+
+    def recent(self, n: int = 20, route: Optional[str] = None) -> List[StoredTrace]:
+        """The n most recently stored traces, newest first."""
+        with self._lock:
+            result = []
+            for offset in range(1, self.capacity + 1):
+                stored = self._slots[(self._next - offset) % self.capacity]
+                if stored is None:
+                    break
+                if route is None or stored.route == route:
+                    result.append(stored)
+                    if len(result) >= n:
+                        break
+            return result
+
+    def slowest(self, n: int = 10, route: Optional[str] = None, min_duration: float = 0.0) -> List[StoredTrace]:
+        """The n slowest stored traces (optionally for one route), slowest first."""
+        with self._lock:
+            candidates = [
+                stored for stored in self._candidates(route) if stored.duration >= min_duration
+            ]
+        return heapq.nlargest(n, candidates, key=lambda stored: stored.duration)
+
+    def errors(self, n: int = 20, route: Optional[str] = None) -> List[StoredTrace]:
+        """The n most recent errored traces (exception, 5xx or a span with error status), newest first."""
+        with self._lock:
+            candidates = [stored for stored in self._candidates(route) if stored.error]
+        return heapq.nlargest(n, candidates, key=lambda stored: stored.trace_context.start_time)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._next = 0
+            self._by_trace_id.clear()
+            self._by_route.clear()
+
+    def _candidates(self, route: Optional[str]) -> List[StoredTrace]:
+        if route is not None:
+            return [self._slots[slot] for slot in self._by_route.get(route, ())]
+        return [stored for stored in self._slots if stored is not None]
+
+
+class TraceStoreApp:
+    """
+    Pure ASGI app exposing a TraceStore as JSON.
+    Usage: app.mount("/debug/traces", TraceStoreApp())
+
+    GET /                      most recent traces       (?n=20&route=/items/{id})
+    GET /slowest               slowest traces           (?n=10&route=...&min_duration_ms=100)
+    GET /errors                most recent errored ones (?n=20&route=...)
+    GET /routes                stored trace count per route
+    GET /{trace_id}            one trace with all its spans
+    """
+
+    def __init__(self, store: Optional[TraceStore] = None):
+        self.store = store or get_trace_store()
+
+    async def __call__(self, scope, receive, send) -> None:
+        scope[SKIP_STORE_SCOPE_KEY] = True
+        path = scope.get("path", "/")
+        root_path = scope.get("root_path", "")
+        # Starlette's Mount keeps the full path and moves the mount prefix into root_path
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        path = path.strip("/")
+        query = urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        route = query.get("route", [None])[0]
+        try:
+            n = int(query.get("n", ["0"])[0]) or None
+            min_duration_ms = float(query.get("min_duration_ms", ["0"])[0])
+        except ValueError:
+            return await self._respond(send, 400, {"error": "n and min_duration_ms must be numbers"})
+
+        if path == "":
+            body: Any = [stored.summary() for stored in self.store.recent(n or 20, route)]
+        elif path == "slowest":
+            body = [stored.summary() for stored in self.store.slowest(n or 10, route, min_duration_ms / 1000.0)]
+        elif path == "errors":
+            body = [stored.summary() for stored in self.store.errors(n or 20, route)]
+        elif path == "routes":
+            body = self.store.routes()
+        else:
+            stored = self.store.get(path)
+            if stored is None:
+                return await self._respond(send, 404, {"error": f"trace {path} not found"})
+            body = stored.to_dict()
+        await self._respond(send, 200, body)
+
+    @staticmethod
+    async def _respond(send, status: int, body: Any) -> None:
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+
+_trace_store: Optional[TraceStore] = None
+
+
+def get_trace_store() -> TraceStore:
+    """Process-wide store shared by TraceMiddleware and TraceStoreApp."""
+    global _trace_store
+    if _trace_store is None:
+        _trace_store = TraceStore(get_config().TRACE_STORE_SIZE)
+    return _trace_store
@@ -0,0 +1,85 @@
+# conftest.py
+import os
+import sys
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Make the package importable when pytest is run from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi_trace_logger.common import TraceContext  # noqa: E402
+from fastapi_trace_logger.config import reload_config  # noqa: E402
+from fastapi_trace_logger.trace_middleware import _trace_context_var  # noqa: E402
+
+
+@pytest.fixture
+def trace_context():
+    """A sampled TraceContext set as the current one for the duration of the test."""
+    context = TraceContext()
+    token = _trace_context_var.set(context)
+    yield context
+    _trace_context_var.reset(token)
+
+
+@pytest.fixture
+def unsampled_trace_context():
+    context = TraceContext(sampled=False)
+    token = _trace_context_var.set(context)
+    yield context
+    _trace_context_var.reset(token)
+
+
+@pytest.fixture
+def propagators(monkeypatch):
+    """W3C plus legacy propagation with the default X-Trace-ID header, restored afterwards."""
+    monkeypatch.setenv("PROPAGATORS", "tracecontext,legacy")
+    monkeypatch.setenv("TRACE_HEADER_NAME", "X-Trace-ID")
+    reload_config()
+    yield
+    monkeypatch.undo()
+    reload_config()
+
+
+DOWNSTREAM_BODY = b"hello from downstream"
+
+
+class _DownstreamHandler(BaseHTTPRequestHandler):
+    """Stand-in downstream service: records request headers, answers /fail with 503."""
+
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._respond()
+
+    def _respond(self):
+        _DownstreamHandler.received.append({name.lower(): value for name, value in self.headers.items()})
+        status = 503 if self.path == "/fail" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(DOWNSTREAM_BODY)))
+        self.end_headers()
+        self.wfile.write(DOWNSTREAM_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def downstream():
+    """A local HTTP server; yields its base url, the headers of each request it received and the body it serves."""
+    _DownstreamHandler.received = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _DownstreamHandler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield types.SimpleNamespace(
+        url=f"http://127.0.0.1:{httpd.server_port}", received=_DownstreamHandler.received, body=DOWNSTREAM_BODY
+    )
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,86 @@
+# test_decorators.py
+import asyncio
+
+from fastapi_trace_logger.common import STATUS_ERROR
+from fastapi_trace_logger.decorators import _open_scopes, trace_span
+
+
+def test_async_generator_forwards_asend_athrow_and_closes_inner(trace_context):
+    received = []
+
+    @trace_span("stream")
+    async def stream():
+        try:
+            value = 0
+            while True:
+                try:
+                    received.append((yield value))
+                except ValueError:
+                    received.append("thrown")
+                value += 1
+        finally:
+            await asyncio.sleep(0.02)
+            received.append("cleanup")
+
+    async def consume():
+        generator = stream()
+        assert await generator.asend(None) == 0
+        assert await generator.asend("a") == 1
+        assert await generator.athrow(ValueError()) == 2
+        await generator.aclose()
+        # The inner generator's cleanup ran on aclose(), not later on GC
+        assert received == ["a", "thrown", "cleanup"]
+
+    asyncio.run(consume())
+
+    (span,) = trace_context.spans
+    assert span.end_time is not None
+    assert span.duration >= 0.02
+
+
+def test_async_generator_records_errors(trace_context):
+    @trace_span("failing")
+    async def failing():
+        yield 1
+        raise RuntimeError("boom")
+
+    async def consume():
+        return [item async for item in failing()]
+
+    try:
+        asyncio.run(consume())
+    except RuntimeError:
+        pass
+    (span,) = trace_context.spans
+    assert span.status == STATUS_ERROR
+
+
+def test_reused_scope_nests_and_runs_concurrently(trace_context):
+    db_span = trace_span("db")
+    with db_span as outer:
+        with db_span as inner:
+            pass
+        assert inner.end_time is not None
+        assert outer.end_time is None
+        assert inner.parent_span_id == outer.span_id
+    assert outer.end_time is not None
+
+    async def query(delay):
+        async with db_span as span:
+            await asyncio.sleep(delay)
+        return span
+
+    async def main():
+        return await asyncio.gather(*(query(0.01 * (3 - i)) for i in range(3)))
+
+    spans = asyncio.run(main())
+    assert all(span.end_time is not None for span in spans)
+    assert len({span.span_id for span in spans}) == 3
+    assert trace_context.current_span is None
+
+
+def test_scope_without_recording_context_opens_nothing(unsampled_trace_context):
+    with trace_span("db") as span:
+        assert span is None
+        assert _open_scopes.get() is None
+    assert unsampled_trace_context.spans == []
@@ -0,0 +1,77 @@
+# test_export_processor.py
+import asyncio
+import threading
+import time
+
+from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.export_processor import BatchExportProcessor
+from fastapi_trace_logger.trace_middleware import TraceMiddleware
+
+
+class _StalledExporter:
+    """Exporter that holds the worker until released, so the queue fills up."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.exported = []
+
+    def export(self, trace_context):
+        self.release.wait(5)
+        self.exported.append(trace_context)
+
+
+def make_trace() -> TraceContext:
+    trace_context = TraceContext()
+    trace_context.close_span(trace_context.new_span("http_request"))
+    return trace_context
+
+
+def fill(processor: BatchExportProcessor, exporter: _StalledExporter) -> None:
+    # One trace held by the stalled worker, one filling the single queue slot
+    processor.submit(make_trace())
+    deadline = time.monotonic() + 2
+    while processor._queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    processor.submit(make_trace())
+    assert processor._queue.full()
+
+
+def test_blocking_submit_drops_after_enqueue_timeout():
+    exporter = _StalledExporter()
+    processor = BatchExportProcessor(
+        exporter, max_queue_size=1, max_batch_size=1, drop_on_overflow=False, enqueue_timeout=0.05
+    )
+    fill(processor, exporter)
+
+    started = time.monotonic()
+    assert processor.submit(make_trace()) is False
+    assert time.monotonic() - started >= 0.05
+    assert processor.dropped_traces == 1
+
+    exporter.release.set()
+    processor.shutdown()
+    assert len(exporter.exported) == 2
+
+
+def test_middleware_waits_for_queue_room_off_the_event_loop():
+    exporter = _StalledExporter()
+    middleware = TraceMiddleware(app=None)
+    middleware.export_processor = processor = BatchExportProcessor(
+        exporter, max_queue_size=1, max_batch_size=1, drop_on_overflow=False, enqueue_timeout=5
+    )
+    fill(processor, exporter)
+    waiting = make_trace()
+
+    async def request_finished():
+        started = time.monotonic()
+        middleware._submit(waiting)
+        returned_after = time.monotonic() - started
+        # Room frees up once the exporter is released; the queued wait then completes
+        exporter.release.set()
+        await asyncio.sleep(0.2)
+        return returned_after
+
+    assert asyncio.run(request_finished()) < 0.05
+    processor.shutdown()
+    assert waiting in exporter.exported
+    assert processor.dropped_traces == 0
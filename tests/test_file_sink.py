@@ -0,0 +1,52 @@
+# test_file_sink.py
+import gzip
+import logging
+import os
+
+from fastapi_trace_logger.file_sink import RotatingCompressedFileHandler
+
+
+def write(handler: RotatingCompressedFileHandler, *messages: str) -> None:
+    for message in messages:
+        handler.emit(logging.makeLogRecord({"msg": message}))
+
+
+def test_rotation_compresses_and_prunes_only_its_own_finished_segments(tmp_path):
+    unrelated = [
+        "app.log.bak",
+        # Looks like a segment but is not compressed yet: still pending, never pruned
+        "app.log.20200101-000000-000000",
+        "app.log.20200101-000000-000001.gz.tmp",
+        "other.log.20200101-000000-000000.gz",
+    ]
+    for name in unrelated:
+        (tmp_path / name).write_bytes(b"keep me")
+
+    handler = RotatingCompressedFileHandler(str(tmp_path / "app.log"), max_bytes=30, backup_count=2)
+    # Each record fills a file, so every record after the first starts a new segment
+    write(handler, *(f"record {i:02d} ------------" for i in range(5)))
+    handler.close()
+
+    segments = sorted(name for name in os.listdir(tmp_path) if name.startswith("app.log.2") and name.endswith(".gz"))
+    assert len(segments) == 2
+    assert all(name not in unrelated for name in segments)
+    # The newest segments survive, oldest first
+    contents = [gzip.decompress((tmp_path / name).read_bytes()).decode() for name in segments]
+    assert contents == ["record 02 ------------\n", "record 03 ------------\n"]
+    assert (tmp_path / "app.log").read_text() == "record 04 ------------\n"
+    assert all((tmp_path / name).read_bytes() == b"keep me" for name in unrelated)
+
+
+def test_uncompressed_segments_are_pruned_without_touching_other_files(tmp_path):
+    (tmp_path / "app.log.bak").write_bytes(b"keep me")
+
+    handler = RotatingCompressedFileHandler(
+        str(tmp_path / "app.log"), max_bytes=30, backup_count=1, compression="none"
+    )
+    write(handler, *(f"record {i:02d} ------------" for i in range(4)))
+    handler.close()
+
+    names = os.listdir(tmp_path)
+    assert "app.log" in names and "app.log.bak" in names
+    (segment,) = [name for name in names if name.startswith("app.log.2")]
+    assert (tmp_path / segment).read_text() == "record 02 ------------\n"
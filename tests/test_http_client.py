@@ -0,0 +1,59 @@
+# test_http_client.py
+import urllib.error
+
+import pytest
+
+from fastapi_trace_logger.common import STATUS_ERROR
+from fastapi_trace_logger.http_client import traced_urlopen
+
+pytestmark = pytest.mark.usefixtures("propagators")
+
+
+def _traceparent_span_id(headers) -> str:
+    return headers["traceparent"].split("-")[2]
+
+
+def test_urllib_injects_headers_and_records_client_span(downstream, trace_context):
+    with traced_urlopen(f"{downstream.url}/items", data=b"abc") as response:
+        assert response.read() == downstream.body
+
+    (span,) = trace_context.spans
+    headers = downstream.received[0]
+    assert headers["x-trace-id"] == trace_context.trace_id
+    assert headers["traceparent"].startswith(f"00-{trace_context.trace_id}-")
+    assert _traceparent_span_id(headers) == span.span_id
+    assert span.name == "HTTP POST"
+    assert span.end_time is not None
+    assert span.attributes["http.status_code"] == 200
+    assert span.attributes["http.request_content_length"] == 3
+    assert span.attributes["http.response_content_length"] == len(downstream.body)
+    assert span.status is None
+
+
+def test_urllib_marks_5xx_and_connection_errors(downstream, trace_context):
+    with pytest.raises(urllib.error.HTTPError):
+        traced_urlopen(f"{downstream.url}/fail")
+    with pytest.raises(urllib.error.URLError):
+        # Port 1 is never listening
+        traced_urlopen("http://127.0.0.1:1/", timeout=2)
+
+    failed, refused = trace_context.spans
+    assert failed.attributes["http.status_code"] == 503
+    assert failed.status == STATUS_ERROR
+    assert refused.status == STATUS_ERROR
+    assert refused.events[0][1] == "exception"
+
+
+def test_urllib_unsampled_propagates_without_spans(downstream, unsampled_trace_context):
+    traced_urlopen(downstream.url).close()
+
+    headers = downstream.received[0]
+    assert headers["x-trace-id"] == unsampled_trace_context.trace_id
+    assert headers["traceparent"].endswith("-00")
+    assert unsampled_trace_context.spans == []
+
+
+def test_urllib_without_trace_context_is_untouched(downstream):
+    traced_urlopen(downstream.url).close()
+    assert "traceparent" not in downstream.received[0]
+    assert "x-trace-id" not in downstream.received[0]
@@ -0,0 +1,156 @@
+# test_http_client_httpx.py
+import asyncio
+
+import pytest
+
+from fastapi_trace_logger.common import STATUS_ERROR
+
+httpx = pytest.importorskip("httpx")
+
+from fastapi_trace_logger.http_client import AsyncTracedTransport, TracedTransport  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures("propagators")
+
+BODY = b"hello from mock"
+
+
+def _traceparent_span_id(headers) -> str:
+    return headers["traceparent"].split("-")[2]
+
+
+def _mock_handler(received):
+    def handler(request):
+        received.append(request.headers)
+        status = 503 if request.url.path == "/fail" else 200
+        return httpx.Response(status, content=BODY)
+
+    return handler
+
+
+# Real HTTP transports: the response body is streamed, so the span ends when it is closed
+
+
+def test_sync_transport_span_ends_when_body_is_closed(downstream, trace_context):
+    with httpx.Client(transport=TracedTransport(httpx.HTTPTransport())) as client:
+        with client.stream("POST", f"{downstream.url}/items", content=b"abcd") as response:
+            (span,) = trace_context.spans
+            assert span.end_time is None
+            assert b"".join(response.iter_bytes()) == downstream.body
+        assert span.end_time is not None
+        failed = client.get(f"{downstream.url}/fail")
+
+    assert failed.status_code == 503
+    failed_span = trace_context.spans[1]
+    assert _traceparent_span_id(downstream.received[0]) == span.span_id
+    assert downstream.received[0]["x-trace-id"] == trace_context.trace_id
+    assert span.attributes["http.status_code"] == 200
+    assert span.attributes["http.request_content_length"] == 4
+    assert span.attributes["http.response_content_length"] == len(downstream.body)
+    assert span.status is None
+    assert failed_span.end_time is not None
+    assert failed_span.attributes["http.response_content_length"] == len(downstream.body)
+    assert failed_span.status == STATUS_ERROR
+
+
+def test_async_transport_span_ends_when_body_is_closed(downstream, trace_context):
+    async def call():
+        transport = AsyncTracedTransport(httpx.AsyncHTTPTransport())
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("GET", f"{downstream.url}/items") as response:
+                (span,) = trace_context.spans
+                assert span.end_time is None
+                body = b"".join([chunk async for chunk in response.aiter_bytes()])
+            return span, body
+
+    span, body = asyncio.run(call())
+
+    assert body == downstream.body
+    assert _traceparent_span_id(downstream.received[0]) == span.span_id
+    assert span.name == "HTTP GET"
+    assert span.end_time is not None
+    assert span.attributes["http.status_code"] == 200
+    assert span.attributes["http.response_content_length"] == len(downstream.body)
+
+
+# Mock transports: the response body is already loaded
+
+
+def test_sync_client_span(trace_context):
+    received = []
+    transport = TracedTransport(httpx.MockTransport(_mock_handler(received)))
+    with httpx.Client(transport=transport) as client:
+        response = client.post("http://downstream/items", content=b"abcd")
+        failed = client.get("http://downstream/fail")
+
+    assert response.content == BODY
+    assert failed.status_code == 503
+    span, failed_span = trace_context.spans
+    assert received[0]["x-trace-id"] == trace_context.trace_id
+    assert _traceparent_span_id(received[0]) == span.span_id
+    assert span.name == "HTTP POST"
+    assert span.end_time is not None
+    assert span.attributes["http.status_code"] == 200
+    assert span.attributes["http.request_content_length"] == 4
+    assert span.attributes["http.response_content_length"] == len(BODY)
+    assert span.status is None
+    assert failed_span.status == STATUS_ERROR
+
+
+def test_sync_transport_error_is_recorded(trace_context):
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    with httpx.Client(transport=TracedTransport(httpx.MockTransport(handler))) as client:
+        with pytest.raises(httpx.ConnectError):
+            client.get("http://downstream/")
+
+    (span,) = trace_context.spans
+    assert span.end_time is not None
+    assert span.status == STATUS_ERROR
+
+
+def test_sync_unsampled_propagates_without_spans(unsampled_trace_context):
+    received = []
+    with httpx.Client(transport=TracedTransport(httpx.MockTransport(_mock_handler(received)))) as client:
+        client.get("http://downstream/")
+
+    assert received[0]["x-trace-id"] == unsampled_trace_context.trace_id
+    assert received[0]["traceparent"].endswith("-00")
+    assert unsampled_trace_context.spans == []
+
+
+def test_async_client_span(trace_context):
+    received = []
+
+    async def handler(request):
+        return _mock_handler(received)(request)
+
+    async def call():
+        async with httpx.AsyncClient(transport=AsyncTracedTransport(httpx.MockTransport(handler))) as client:
+            return await client.get("http://downstream/items")
+
+    response = asyncio.run(call())
+
+    assert response.content == BODY
+    (span,) = trace_context.spans
+    assert _traceparent_span_id(received[0]) == span.span_id
+    assert span.name == "HTTP GET"
+    assert span.end_time is not None
+    assert span.attributes["http.status_code"] == 200
+    assert span.attributes["http.response_content_length"] == len(BODY)
+
+
+def test_async_unsampled_propagates_without_spans(unsampled_trace_context):
+    received = []
+
+    async def handler(request):
+        return _mock_handler(received)(request)
+
+    async def call():
+        async with httpx.AsyncClient(transport=AsyncTracedTransport(httpx.MockTransport(handler))) as client:
+            await client.get("http://downstream/")
+
+    asyncio.run(call())
+
+    assert received[0]["x-trace-id"] == unsampled_trace_context.trace_id
+    assert unsampled_trace_context.spans == []
@@ -0,0 +1,52 @@
+# test_logger.py
+import logging
+
+from fastapi_trace_logger.logger import BoundLogger, bind_context, install_trace_enrichment, trace_context_filter
+
+
+def test_install_trace_enrichment_covers_non_propagating_loggers_by_name():
+    handlers = {}
+    for name in ("test.uvicorn", "test.uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.propagate = False
+        handlers[name] = logging.NullHandler()
+        logger.addHandler(handlers[name])
+    try:
+        assert install_trace_enrichment("test.uvicorn", logging.getLogger("test.uvicorn.access")) == 2
+        assert all(trace_context_filter in handler.filters for handler in handlers.values())
+        # Already installed handlers are skipped
+        assert install_trace_enrichment("test.uvicorn", "test.uvicorn.access") == 0
+    finally:
+        for name, handler in handlers.items():
+            logging.getLogger(name).removeHandler(handler)
+
+
+def test_bound_logger_fields_named_msg_or_level_and_span_event_fields(trace_context):
+    logger = logging.getLogger("test.bound")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    handler.addFilter(trace_context_filter)
+    logger.addHandler(handler)
+    try:
+        bind_context(user_id=7)
+        span = trace_context.new_span("checkout")
+        log = BoundLogger(logger, {"order_id": 1}, span_events=True)
+        log.info("captured %s", "card", msg="raw", level="gold")
+        log.log(logging.WARNING, "retry", level=3)
+        trace_context.close_span(span)
+    finally:
+        logger.removeHandler(handler)
+
+    assert records[0].getMessage() == "captured card"
+    assert records[0].log_fields == {"order_id": 1, "msg": "raw", "level": "gold"}
+    assert records[1].levelno == logging.WARNING
+    assert records[1].log_fields["level"] == 3
+    (event_time, name, attributes), _ = span.events
+    assert name == "log"
+    assert attributes == {
+        "log.severity": "INFO", "log.message": "captured card",
+        "user_id": 7, "order_id": 1, "msg": "raw", "level": "gold",
+    }
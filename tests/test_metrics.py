@@ -0,0 +1,18 @@
+# test_metrics.py
+from fastapi_trace_logger.common import TraceContext
+from fastapi_trace_logger.metrics import OVERFLOW_LABEL, MetricsAggregator
+
+
+def test_series_overflow_folds_every_label():
+    metrics = MetricsAggregator(max_series=2)
+    trace_context = TraceContext()
+    for i in range(10):
+        trace_context.close_span(trace_context.new_span(f"fetch user {i}"))
+        metrics.record_request(f"/items/{i}", f"METHOD{i}", 200 + i, 0.01)
+    metrics.record_spans("/items", trace_context.spans)
+
+    assert len(metrics._span_durations) == 3
+    assert metrics._span_durations[(OVERFLOW_LABEL, OVERFLOW_LABEL)].count == 8
+    assert len(metrics._requests) == 3
+    assert metrics._requests[(OVERFLOW_LABEL,) * 3] == 8
+    assert len(metrics._request_durations) == 3
@@ -0,0 +1,195 @@
+# test_otlp_exporter.py
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fastapi_trace_logger import exporter as exporter_module
+from fastapi_trace_logger.common import STATUS_ERROR, TraceContext
+from fastapi_trace_logger.config import Config
+from fastapi_trace_logger.exporter import OtlpExporter
+
+
+class _Collector(BaseHTTPRequestHandler):
+    """Stand-in OTLP/HTTP collector: records every request and answers with the queued statuses (then 200)."""
+
+    protocol_version = "HTTP/1.1"
+    requests = []
+    statuses = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        _Collector.requests.append({
+            "path": self.path,
+            "headers": {name.lower(): value for name, value in self.headers.items()},
+            "body": body,
+            "client_port": self.client_address[1],
+        })
+        status = _Collector.statuses.pop(0) if _Collector.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def collector():
+    _Collector.requests = []
+    _Collector.statuses = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Collector)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/v1/traces"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(exporter_module.time, "sleep", lambda seconds: None)
+
+
+def make_exporter(endpoint: str, **settings: str) -> OtlpExporter:
+    environ = {"EXPORTER": "otlp", "OTLP_ENDPOINT": endpoint, "SERVICE_NAME": "orders", **settings}
+    return OtlpExporter(Config(environ))
+
+
+def make_trace() -> TraceContext:
+    trace_context = TraceContext()
+    root = trace_context.new_span("http_request", trace_context.parent_span_id)
+    root.set_attribute("http.method", "GET")
+    child = trace_context.new_span("db_query")
+    child.add_event("cache_miss", {"key": "user:1"})
+    child.record_exception(ValueError("boom"))
+    trace_context.close_span(child)
+    trace_context.close_span(root)
+    return trace_context
+
+
+def test_json_payload(collector):
+    otlp = make_exporter(collector, OTLP_ENCODING="json", OTLP_COMPRESSION="none", OTLP_HEADERS="x-api-key=secret")
+    trace_context = make_trace()
+    otlp.export(trace_context)
+    otlp.shutdown()
+
+    (request,) = _Collector.requests
+    assert request["path"] == "/v1/traces"
+    assert request["headers"]["content-type"] == "application/json"
+    assert request["headers"]["x-api-key"] == "secret"
+    assert "content-encoding" not in request["headers"]
+
+    resource_spans = json.loads(request["body"])["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "orders"}}]
+    root, child = resource_spans["scopeSpans"][0]["spans"]
+    root_span, child_span = trace_context.spans
+    assert root["traceId"] == child["traceId"] == trace_context.trace_id
+    assert root["spanId"] == root_span.span_id
+    assert root["parentSpanId"] == ""
+    assert child["parentSpanId"] == root_span.span_id
+    assert root["kind"] == 2
+    assert child["kind"] == 1
+    assert int(root["startTimeUnixNano"]) == root_span._start_ns
+    assert int(root["endTimeUnixNano"]) == root_span._end_ns
+    assert {"key": "http.method", "value": {"stringValue": "GET"}} in root["attributes"]
+    assert [event["name"] for event in child["events"]] == ["cache_miss", "exception"]
+    assert child["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert child_span.status == STATUS_ERROR
+
+
+def test_gzip_protobuf_payload(collector):
+    trace_service_pb2 = pytest.importorskip("opentelemetry.proto.collector.trace.v1.trace_service_pb2")
+    otlp = make_exporter(collector, OTLP_ENCODING="protobuf", OTLP_COMPRESSION="gzip")
+    trace_context = make_trace()
+    otlp.export(trace_context)
+    otlp.shutdown()
+
+    (request,) = _Collector.requests
+    assert request["headers"]["content-type"] == "application/x-protobuf"
+    assert request["headers"]["content-encoding"] == "gzip"
+
+    message = trace_service_pb2.ExportTraceServiceRequest()
+    message.ParseFromString(gzip.decompress(request["body"]))
+    resource_spans = message.resource_spans[0]
+    assert resource_spans.resource.attributes[0].key == "service.name"
+    assert resource_spans.resource.attributes[0].value.string_value == "orders"
+    root, child = resource_spans.scope_spans[0].spans
+    root_span, child_span = trace_context.spans
+    assert root.trace_id.hex() == trace_context.trace_id
+    assert root.span_id.hex() == root_span.span_id
+    assert root.parent_span_id == b""
+    assert child.parent_span_id.hex() == root_span.span_id
+    assert root.start_time_unix_nano == root_span._start_ns
+    assert child.end_time_unix_nano == child_span._end_ns
+    assert root.attributes[0].key == "http.method"
+    assert [event.name for event in child.events] == ["cache_miss", "exception"]
+    assert child.events[0].attributes[0].value.string_value == "user:1"
+    assert child.status.code == 2
+    assert child.status.message == "ValueError: boom"
+
+
+def test_retries_retryable_status(collector):
+    otlp = make_exporter(collector, OTLP_COMPRESSION="none", OTLP_MAX_RETRIES="3")
+    _Collector.statuses = [503, 503]
+    otlp.export(make_trace())
+    otlp.shutdown()
+
+    assert len(_Collector.requests) == 3
+    assert len({request["body"] for request in _Collector.requests}) == 1
+    assert not otlp._retry_buffer
+
+
+def test_does_not_retry_rejected_payload(collector):
+    otlp = make_exporter(collector, OTLP_COMPRESSION="none", OTLP_MAX_RETRIES="3")
+    _Collector.statuses = [400]
+    otlp.export(make_trace())
+    otlp.shutdown()
+
+    assert len(_Collector.requests) == 1
+    assert not otlp._retry_buffer
+
+
+def test_retry_buffer_resends_failed_payloads_first(collector):
+    otlp = make_exporter(collector, OTLP_COMPRESSION="none", OTLP_MAX_RETRIES="0")
+    _Collector.statuses = [503, 503]
+    otlp.export(make_trace())
+    otlp.export(make_trace())
+    kept = list(otlp._retry_buffer)
+    assert len(kept) == 2
+
+    otlp.export(make_trace())
+    otlp.shutdown()
+
+    # The second export resends nothing: the first payload at the head of the buffer failed again
+    bodies = [request["body"] for request in _Collector.requests]
+    assert bodies[:2] == [kept[0], kept[0]]
+    assert bodies[2:4] == kept
+    assert len(bodies) == 5
+    assert not otlp._retry_buffer
+
+
+def test_retry_buffer_is_bounded(collector):
+    otlp = make_exporter(collector, OTLP_COMPRESSION="none", OTLP_MAX_RETRIES="0", OTLP_RETRY_BUFFER_SIZE="2")
+    _Collector.statuses = [503] * 3
+    for _ in range(3):
+        otlp.export(make_trace())
+    otlp.shutdown()
+
+    # The oldest failed payload is dropped; the second one, retried last, is now at the head
+    first, second = _Collector.requests[0]["body"], _Collector.requests[-1]["body"]
+    assert len(otlp._retry_buffer) == 2
+    assert otlp._retry_buffer[0] == second
+    assert first not in otlp._retry_buffer
+
+
+def test_reuses_kept_alive_connection(collector):
+    otlp = make_exporter(collector, OTLP_COMPRESSION="none")
+    for _ in range(3):
+        otlp.export(make_trace())
+    otlp.shutdown()
+
+    assert len(_Collector.requests) == 3
+    assert len({request["client_port"] for request in _Collector.requests}) == 1
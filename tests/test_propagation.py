@@ -0,0 +1,123 @@
+# test_propagation.py
+import pytest
+
+from fastapi_trace_logger.propagation import (
+    B3Propagator,
+    CompositePropagator,
+    TraceHeaderPropagator,
+    W3CTraceContextPropagator,
+)
+from fastapi_trace_logger.trace_middleware import TraceMiddleware
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+# W3C Trace Context
+
+
+def test_w3c_extracts_valid_traceparent_and_tracestate():
+    context = W3CTraceContextPropagator().extract({
+        b"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-01".encode(),
+        b"tracestate": b"vendor=value",
+    })
+    assert (context.trace_id, context.parent_span_id) == (TRACE_ID, SPAN_ID)
+    assert context.sampled is True
+    assert context.tracestate == "vendor=value"
+
+
+def test_w3c_unsampled_flag():
+    context = W3CTraceContextPropagator().extract({b"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-00".encode()})
+    assert context.sampled is False
+    assert context.tracestate is None
+
+
+def test_w3c_future_version_may_carry_extra_fields():
+    context = W3CTraceContextPropagator().extract({b"traceparent": f"01-{TRACE_ID}-{SPAN_ID}-01-extra".encode()})
+    assert context.trace_id == TRACE_ID
+
+
+@pytest.mark.parametrize("traceparent", [
+    f"00-{'0' * 32}-{SPAN_ID}-01",  # all-zero trace id
+    f"00-{TRACE_ID}-{'0' * 16}-01",  # all-zero parent id
+    f"ff-{TRACE_ID}-{SPAN_ID}-01",  # forbidden version
+    f"00-{TRACE_ID}-{SPAN_ID}-01-extra",  # version 00 has exactly four fields
+    f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",  # short trace id
+    f"00-{TRACE_ID[:-1]}g-{SPAN_ID}-01",  # not hex
+    f"00-{TRACE_ID}-{SPAN_ID}",  # missing flags
+    "garbage",
+])
+def test_w3c_rejects_invalid_traceparent(traceparent):
+    assert W3CTraceContextPropagator().extract({b"traceparent": traceparent.encode()}) is None
+
+
+# B3
+
+
+def test_b3_single_header():
+    b3 = B3Propagator()
+    context = b3.extract({b"b3": f"{TRACE_ID}-{SPAN_ID}-1".encode()})
+    assert (context.trace_id, context.parent_span_id, context.sampled) == (TRACE_ID, SPAN_ID, True)
+    assert b3.extract({b"b3": f"{TRACE_ID}-{SPAN_ID}-0".encode()}).sampled is False
+    assert b3.extract({b"b3": f"{TRACE_ID}-{SPAN_ID}-d".encode()}).sampled is True
+    # No sampling state: the decision is left to this service
+    assert b3.extract({b"b3": f"{TRACE_ID}-{SPAN_ID}".encode()}).sampled is None
+
+
+def test_b3_short_trace_id_is_left_padded():
+    context = B3Propagator().extract({b"b3": f"{TRACE_ID[16:]}-{SPAN_ID}-1".encode()})
+    assert context.trace_id == "0" * 16 + TRACE_ID[16:]
+
+
+def test_b3_multi_headers():
+    b3 = B3Propagator()
+    headers = {b"x-b3-traceid": TRACE_ID.upper().encode(), b"x-b3-spanid": SPAN_ID.encode(), b"x-b3-sampled": b"0"}
+    context = b3.extract(headers)
+    assert (context.trace_id, context.parent_span_id, context.sampled) == (TRACE_ID, SPAN_ID, False)
+    # The debug flag forces sampling
+    assert b3.extract({**headers, b"x-b3-flags": b"1"}).sampled is True
+
+
+@pytest.mark.parametrize("headers", [
+    {b"b3": b"1"},  # a bare sampling decision carries no ids
+    {b"b3": f"{'0' * 32}-{SPAN_ID}-1".encode()},
+    {b"b3": f"{TRACE_ID}-{'0' * 16}-1".encode()},
+    {b"b3": f"{TRACE_ID[:20]}-{SPAN_ID}-1".encode()},
+    {b"x-b3-traceid": TRACE_ID.encode()},  # no span id
+    {b"x-b3-traceid": b"0" * 32, b"x-b3-spanid": SPAN_ID.encode()},
+])
+def test_b3_rejects_invalid_headers(headers):
+    assert B3Propagator().extract(headers) is None
+
+
+# Precedence
+
+
+def test_composite_falls_back_to_lower_precedence_propagator():
+    composite = CompositePropagator([W3CTraceContextPropagator(), TraceHeaderPropagator()])
+    headers = {b"traceparent": f"00-{'0' * 32}-{SPAN_ID}-01".encode(), b"x-trace-id": b"legacy-id"}
+    context = composite.extract(headers)
+    assert (context.trace_id, context.parent_span_id, context.sampled) == ("legacy-id", "0", None)
+    assert composite.extract({}) is None
+
+
+def test_middleware_rescans_past_an_invalid_first_propagator(propagators):
+    middleware = TraceMiddleware(app=None)
+    # The invalid traceparent comes first, so the early-stopping scan never reaches x-trace-id
+    scope = {"type": "http", "headers": [
+        (b"traceparent", f"00-{'0' * 32}-{SPAN_ID}-01".encode()),
+        (b"tracestate", b"vendor=value"),
+        (b"x-trace-id", b"legacy-id"),
+        (b"x-parent-span-id", SPAN_ID.encode()),
+    ]}
+    trace_context = middleware._start_trace_context(scope)
+    assert (trace_context.trace_id, trace_context.parent_span_id) == ("legacy-id", SPAN_ID)
+
+
+def test_middleware_honors_unsampled_upstream(propagators):
+    middleware = TraceMiddleware(app=None)
+    scope = {"type": "http", "headers": [(b"traceparent", f"00-{TRACE_ID}-{SPAN_ID}-00".encode())]}
+    trace_context = middleware._start_trace_context(scope)
+    assert trace_context.trace_id == TRACE_ID
+    assert trace_context.parent_span_id == SPAN_ID
+    assert trace_context.sampled is False
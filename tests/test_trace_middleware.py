@@ -0,0 +1,101 @@
+# test_trace_middleware.py
+import asyncio
+
+from fastapi_trace_logger.trace_middleware import TraceMiddleware, get_current_trace_context
+
+
+def http_scope(headers=()):
+    return {"type": "http", "method": "GET", "path": "/items", "headers": list(headers)}
+
+
+def run(middleware, scope, incoming=None):
+    """Drive one ASGI connection through the middleware and return the messages it sent."""
+    sent = []
+    incoming = list(incoming or [{"type": "http.request", "body": b"", "more_body": False}])
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def test_response_headers_do_not_mutate_the_apps_header_list():
+    # Starlette keeps one raw_headers list per Response and sends it as-is
+    app_headers = [(b"content-type", b"text/plain")]
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": app_headers})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = TraceMiddleware(app)
+    for _ in range(2):
+        start = run(middleware, http_scope())[0]
+        names = [name for name, _ in start["headers"]]
+        assert names.count(b"traceparent") == 1
+        assert names.count(b"x-trace-id") == 1
+    assert app_headers == [(b"content-type", b"text/plain")]
+
+
+def test_streamed_response_root_span_ends_with_the_last_chunk():
+    traces = []
+
+    async def app(scope, receive, send):
+        traces.append(get_current_trace_context())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.body", "body": b"ab", "more_body": True})
+        await asyncio.sleep(0.1)
+        await send({"type": "http.response.body", "body": b"cde", "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        # Background work after the response must not count towards its latency
+        await asyncio.sleep(0.2)
+
+    middleware = TraceMiddleware(app, enable_performance=True)
+    durations = []
+    middleware._submit = lambda trace_context, duration=None: durations.append(duration)
+    run(middleware, http_scope())
+
+    (root,) = traces[0].spans
+    assert root.end_time is not None
+    assert 0.15 <= root.duration < 0.3
+    assert root.attributes["http.response_content_length"] == 5
+    assert root.attributes["http.status_code"] == 200
+    # First body byte went out after the first sleep, well before the end of the stream
+    assert 50 <= root.attributes["http.time_to_first_byte_ms"] < root.duration * 1000 - 50
+    (duration,) = durations
+    assert 0.15 <= duration < 0.3
+
+
+def test_websocket_session_counts_messages_and_utf8_bytes():
+    traces = []
+
+    async def app(scope, receive, send):
+        traces.append(get_current_trace_context())
+        await receive()
+        await send({"type": "websocket.accept"})
+        await receive()
+        await receive()
+        await send({"type": "websocket.send", "text": "\u00fc"})
+        await receive()
+
+    middleware = TraceMiddleware(app, enable_performance=True)
+    sent = run(middleware, {"type": "websocket", "path": "/ws", "headers": []}, [
+        {"type": "websocket.connect"},
+        {"type": "websocket.receive", "text": "h\u00e9llo"},
+        {"type": "websocket.receive", "bytes": b"abc"},
+        {"type": "websocket.disconnect", "code": 1001},
+    ])
+
+    assert any(name == b"traceparent" for name, _ in sent[0]["headers"])
+    (session,) = traces[0].spans
+    assert session.name == "websocket_session"
+    assert session.end_time is not None
+    assert session.attributes["websocket.messages_received"] == 2
+    assert session.attributes["websocket.bytes_received"] == 6 + 3
+    assert session.attributes["websocket.messages_sent"] == 1
+    assert session.attributes["websocket.bytes_sent"] == 2
+    assert session.attributes["websocket.close_code"] == 1001